@@ -1,13 +1,25 @@
-from sys import exit as sys_exit
+from tempfile import TemporaryDirectory
+from sys import exit as sys_exit, platform
 from subprocess import run
+from shutil import move
 from logging import info
+from os import cpu_count
 from pathlib import Path
 
+from llvmlite import binding as llvm
+
 from gem.passes.name_type_resolver import NameAndTypeResolverPass
 from gem.passes.code_generation import CodeGenerationPass
 from gem.passes.memory_manager import MemoryManagerPass
 from gem.passes.node_expansion import NodeExpansionPass
-from gem.ir_builder import IRBuilder
+from gem.build_cache import BuildCache, default_cache_dir
+from gem.ir_serializer import dump_ir
+from gem.llvm_backend import BACKENDS, OPT_LEVELS, emit_object, create_jit, call_main, target_cpu, target_errors
+from gem.pass_manager import PassManager
+from gem.scheduler import BuildScheduler, CommandError, run_command
+from gem.sharding import generate_sharded
+from gem.ir_builder import IRBuilder, PARSERS
+from gem.timing import TIMER
 from gem import ir
 
 
@@ -15,56 +27,102 @@ VERSION = '0.0.1'
 GEM_DIR = Path(__file__).parent
 CRUNTIME_DIR = GEM_DIR / 'cruntime'
 TESTS_DIR = GEM_DIR / 'tests'
+SHARED_LIBRARY_SUFFIX = {'win32': '.dll', 'darwin': '.dylib'}.get(platform, '.so')
+
+BUILD_CACHE = BuildCache(default_cache_dir(), VERSION)
 
 PASSES = [NameAndTypeResolverPass, NodeExpansionPass, MemoryManagerPass]
+PASS_MANAGER = PassManager(PASSES)
 
 def parse(file: ir.File):
     info(f'Parsing file {file.path.as_posix()}')
-    ir_builder = IRBuilder(file)
-    program = ir_builder.build()
-    if not file.options.no_stdlib:
-        program.nodes.insert(0, ir.Use(program.pos, 'core'))
+    with TIMER.phase('parse', file.path) as timing:
+        if file.options.parser == 'antlr':
+            # the ANTLR runtime is slow to import, only load it when it is asked for
+            from gem.antlr_ir_builder import ANTLRIRBuilder
+            ir_builder = ANTLRIRBuilder(file)
+        else:
+            ir_builder = IRBuilder(file)
+        
+        program = ir_builder.build()
+        if not file.options.no_stdlib:
+            program.nodes.insert(0, ir.Use(program.pos, 'core'))
+        
+        timing.count_nodes(program)
     
     return program
 
+def write_debug_ir(file: ir.File, stage: str, program: ir.Program):
+    ir_file = file.path.with_stem(f'{file.path.stem}_{stage}').with_suffix('.gir')
+    ir_file.write_text(str(program))
+    ir_file.with_suffix('.girb').write_bytes(dump_ir(program))
+
 def run_compile_passes(file: ir.File):
-    program = parse(file)
-    ir_file = file.path.with_stem(f'{file.path.stem}_base').with_suffix('.gir')
+    if (entry := BUILD_CACHE.load_passes(file)) is not None:
+        file.scope = entry.scope
+        return entry.program
+    
+    # the parsed IR only depends on the file itself so it stays valid when a used library or the output options change
+    program = BUILD_CACHE.load_ir(file, 'parse')
+    if program is None:
+        program = parse(file)
+        BUILD_CACHE.store_ir(file, 'parse', program)
+    
     if file.options.debug:
-        ir_file.write_text(str(program))
+        write_debug_ir(file, 'base', program)
     
-    for i, cls in enumerate(PASSES, start=1):
-        info(f'Running pass {i}: {cls.__name__} on file {file.path.as_posix()}')
-        program = cls.run(file, program)
+    # the IR between fused passes never exists as a whole, so --debug runs every pass on its own to dump it
+    i = 0
+    for group in PASS_MANAGER.schedule(fuse=not file.options.debug):
+        i += len(group)
+        name = '+'.join(cls.__name__ for cls in group)
+        info(f'Running pass {i}: {name} on file {file.path.as_posix()}')
+        with TIMER.phase(name, file.path) as timing:
+            program = PASS_MANAGER.run_group(file, program, group)
+            timing.count_nodes(program)
+        
         if file.options.debug:
-            ir_file = file.path.with_stem(f'{file.path.stem}_pass{i}').with_suffix('.gir')
-            ir_file.write_text(str(program))
+            write_debug_ir(file, f'pass{i}', program)
         
-        info(f'Successfully ran pass {i}: {cls.__name__} on file {file.path.as_posix()}')
+        info(f'Successfully ran pass {i}: {name} on file {file.path.as_posix()}')
     
+    BUILD_CACHE.store_passes(file, program)
     return program
 
-def compile_to_str(file: ir.File):
-    program = run_compile_passes(file)
-    return CodeGenerationPass.run(file, program)
+def compile_to_str(file: ir.File, program: ir.Program | None = None):
+    """`program` is the result of `run_compile_passes(file)` when the caller already ran the passes"""
+    if program is None:
+        program = run_compile_passes(file)
+    
+    with TIMER.phase(CodeGenerationPass.__name__, file.path):
+        code = generate_sharded(file, program) if file.options.shard_functions else None
+        return code if code is not None else CodeGenerationPass.run(file, program)
 
-def compile_to_ir(file: ir.File):
-    code = compile_to_str(file)
+def compile_to_ir(file: ir.File, program: ir.Program | None = None):
+    code = compile_to_str(file, program)
     ll_file = file.path.with_suffix('.ll')
     ll_file.write_text(code)
     return ll_file
     
-def compile_to_obj(file: ir.File):
-    ll_file = compile_to_ir(file)
+def compile_to_obj_with_clang(file: ir.File, program: ir.Program | None = None):
+    ll_file = compile_to_ir(file, program)
     obj_file = file.path.with_suffix('.o')
-    flags = ['-Wno-override-module', '-Wall', '-Werror', '-Wpedantic', '-Wextra']
-    if file.options.optimize:
-        flags.append('-O2')
+    flags = [
+        '-Wno-override-module', '-Wall', '-Werror', '-Wpedantic', '-Wextra', f'-O{file.options.opt_level}',
+        f'-march={file.options.target_cpu}'
+    ]
+    for feature in filter(None, file.options.target_features.split(',')):
+        flags.append(f'-Xclang -target-feature -Xclang {feature}')
+    
+    if not file.options.vectorize:
+        flags.append('-fno-vectorize')
+    
+    if not file.options.slp_vectorize:
+        flags.append('-fno-slp-vectorize')
     
     flags_str = ' '.join(flags)
-    cmd = f'clang -c -o {obj_file} {ll_file} {flags_str}'
-    info(f'Executing compilation command: {cmd}')
-    run(cmd, shell=True)
+    # raises before a stale object file left by an earlier build could be moved into the cache
+    run_command(f'clang -c -o {obj_file} {ll_file} {flags_str}', 'clang', file.path)
     info(f'Wrote object file to {obj_file}')
     
     if file.options.clean:
@@ -72,28 +130,102 @@ def compile_to_obj(file: ir.File):
     
     return obj_file
 
+def library_bitcode(file: ir.File):
+    # without optimizations nothing would be inlined, the libraries are not linked into the module
+    if file.options.opt_level == '0':
+        return []
+    
+    file.codegen_data.wait_for_object_files()
+    return file.codegen_data.library_bitcode()
+
+def compile_to_obj_in_process(file: ir.File, library: bool = False, program: ir.Program | None = None):
+    code = compile_to_str(file, program)
+    if file.options.debug:
+        file.path.with_suffix('.ll').write_text(code)
+    
+    obj_file = file.path.with_suffix('.o')
+    # the modules that use a library link its bitcode in to inline its functions
+    bitcode_file = obj_file.with_suffix('.bc') if library else None
+    libraries = library_bitcode(file)
+    with TIMER.phase('emit object', file.path):
+        obj_file.write_bytes(emit_object(code, file.options, libraries, bitcode_file))
+    info(f'Wrote object file to {obj_file}')
+    return obj_file
+
+def compile_to_obj(file: ir.File, library: bool = False, program: ir.Program | None = None):
+    if (obj_file := BUILD_CACHE.load_object(file)) is not None:
+        return obj_file
+    
+    if file.options.backend == 'clang':
+        obj_file = compile_to_obj_with_clang(file, program)
+    else:
+        obj_file = compile_to_obj_in_process(file, library, program)
+    
+    file.codegen_data.wait_for_object_files()
+    return BUILD_CACHE.store_object(file, obj_file)
+
+def run_in_process(file: ir.File):
+    scheduler = BuildScheduler.get(file.options.jobs)
+    runtime = scheduler.submit(('runtime', CRUNTIME_DIR, 'shared'), compile_runtime, file, True)
+    
+    code = compile_to_str(file)
+    file.codegen_data.wait_for_object_files()
+    llvm.load_library_permanently(str(runtime.result()))
+    scheduler.finish()
+    
+    with TIMER.phase('jit', file.path):
+        engine = create_jit(code, file.codegen_data.object_files, file.options, library_bitcode(file))
+    
+    return call_main(engine)
+
+def compile_runtime(file: ir.File, shared: bool = False):
+    cfiles = list(CRUNTIME_DIR.rglob('*.c'))
+    suffix = SHARED_LIBRARY_SUFFIX if shared else '.a'
+    library = BUILD_CACHE.runtime_library(llvm.get_default_triple(), cfiles, suffix)
+    if library.exists() and not file.options.no_cache:
+        info(f'Using cached C runtime {library}')
+        return library
+    
+    library.parent.mkdir(parents=True, exist_ok=True)
+    with TemporaryDirectory() as tmp_dir:
+        tmp_library = Path(tmp_dir) / library.name
+        if shared:
+            cfiles_str = ' '.join(str(cfile) for cfile in cfiles)
+            run_command(f'clang -shared -fPIC -o {tmp_library} {cfiles_str}', 'clang', library)
+        else:
+            # a failed command raises before anything is moved into the cache, an archive with objects missing from it
+            # would be reused by every later build
+            cobjects = [Path(tmp_dir) / cfile.with_suffix('.o').name for cfile in cfiles]
+            scheduler = BuildScheduler.get(file.options.jobs)
+            scheduler.run_commands('clang', [(cfile, f'clang -c -o {cobj} {cfile}') for cfile, cobj in zip(cfiles, cobjects)])
+            
+            cobjects_str = ' '.join(str(cobj) for cobj in cobjects)
+            run_command(f'llvm-ar rcs {tmp_library} {cobjects_str}', 'archive', library)
+        
+        move(tmp_library, library)
+    
+    info(f'Wrote C runtime to {library}')
+    return library
+
 def compile_to_exe(file: ir.File):
+    scheduler = BuildScheduler.get(file.options.jobs)
+    runtime = scheduler.submit(('runtime', CRUNTIME_DIR), compile_runtime, file)
+    
     obj_file = compile_to_obj(file)
     exe_file = file.path.with_suffix('.exe')
     object_files = file.codegen_data.object_files
     object_files.append(obj_file)
-    for cfile in CRUNTIME_DIR.rglob('*.c'):
-        cobj = cfile.with_suffix('.o')
-        cmd = f'clang -c -o {cobj} {cfile}'
-        info(f'Executing compilation command: {cmd}')
-        
-        run(cmd, shell=True)
-        object_files.append(cobj)
     
     object_files_str = ' '.join(str(obj_file) for obj_file in object_files)
-    cmd = f'clang -o {exe_file} {object_files_str}'
-    info(f'Executing compilation command: {cmd}')
-    run(cmd, shell=True)
+    run_command(f'clang -o {exe_file} {object_files_str} {runtime.result()}', 'link', exe_file)
     info(f'Wrote executable to {exe_file}')
+    scheduler.finish()
     
     if file.options.clean:
         for obj in object_files:
-            obj.unlink()
+            if not BUILD_CACHE.owns(obj):
+                obj.unlink()
+                obj.with_suffix('.bc').unlink(missing_ok=True)
     
     return exe_file
 
@@ -124,7 +256,15 @@ Available actions:\n{actions_str}""")
         if method is None:
             self.error(f'unknown action \'{action}\'')
         
-        return method()
+        if self.option('time-passes'):
+            TIMER.start()
+        try:
+            return method()
+        except CommandError as e:
+            self.error(f'error: {e}')
+        finally:
+            if TIMER.enabled:
+                TIMER.report(self.option_value('time-passes', 'text'))
 
     def arg(self, index: int):
         if index < len(self.args):
@@ -139,6 +279,52 @@ Available actions:\n{actions_str}""")
         
         return False
     
+    def option_value(self, name: str, default: str):
+        for arg in self.args:
+            if arg.startswith(f'--{name}='):
+                return arg.removeprefix(f'--{name}=')
+        
+        return default
+    
+    def jobs(self):
+        jobs = self.option_value('jobs', '')
+        for i, arg in enumerate(self.args):
+            if arg == '-j':
+                jobs = self.arg(i + 1) or ''
+            elif arg.startswith('-j'):
+                jobs = arg.removeprefix('-j')
+        
+        if not jobs:
+            return cpu_count() or 1
+        
+        if not jobs.isdigit() or int(jobs) < 1:
+            self.error(f"""Usage: gem build <file> -j <jobs>
+Invalid number of jobs \'{jobs}\'""")
+        
+        return int(jobs)
+    
+    def opt_level(self):
+        level = '2' if self.option('optimize') else '0'
+        for arg in self.args:
+            if arg.startswith('-O'):
+                level = arg.removeprefix('-O')
+        
+        if level not in OPT_LEVELS:
+            levels_str = ', '.join(f'-O{level}' for level in OPT_LEVELS)
+            self.error(f"""Usage: gem build <file> -O<level>
+Invalid optimization level '{level}', available levels: {levels_str}""")
+        
+        return level
+    
+    def target_features(self):
+        features = self.option_value('target-features', '')
+        for feature in filter(None, features.split(',')):
+            if feature[0] not in '+-' or len(feature) == 1:
+                self.error(f"""Usage: gem build <file> --target-features=+<feature>,-<feature>
+Invalid target feature '{feature}', features are enabled with '+' and disabled with '-'""")
+        
+        return features
+    
     def action_test(self):
         test_name = self.arg(1)
         if test_name is None:
@@ -154,25 +340,56 @@ No test named \'{test_name}\'""")
         run(f'{exe_file}', shell=True)
     
     def action_build(self, file_path: str | None = None, options: ir.CompileOptions | None = None):
+        file = self.get_file('build', file_path, options)
+        return compile_to_exe(file)
+    
+    def action_run(self):
+        file = self.get_file('run')
+        exit_code = run_in_process(file)
+        if exit_code is None:
+            self.error(f"""Usage: gem run <file>
+File \'{file.path}\' has no main function""")
+        
+        sys_exit(exit_code)
+    
+    def get_file(self, action: str, file_path: str | None = None, options: ir.CompileOptions | None = None):
         if file_path is None:
             file_path = self.arg(1)
         
         if file_path is None:
-            self.error("""Usage: gem build <file>
+            self.error(f"""Usage: gem {action} <file>
 No file""")
         
         path = Path(file_path)
         if not path.exists():
-            self.error(f"""Usage: gem build <file>
+            self.error(f"""Usage: gem {action} <file>
 File \'{path}\' does not exist""")
         
         if not path.is_file():
-            self.error(f"""Usage: gem build <file>
+            self.error(f"""Usage: gem {action} <file>
 File \'{path}\' is not a file""")
         
+        backend = self.option_value('backend', BACKENDS[0])
+        if backend not in BACKENDS:
+            backends_str = ', '.join(BACKENDS)
+            self.error(f"""Usage: gem {action} <file> --backend=<backend>
+Unknown backend \'{backend}\', available backends: {backends_str}""")
+        
+        parser = self.option_value('parser', PARSERS[0])
+        if parser not in PARSERS:
+            parsers_str = ', '.join(PARSERS)
+            self.error(f"""Usage: gem {action} <file> --parser=<parser>
+Unknown parser \'{parser}\', available parsers: {parsers_str}""")
+        
         options = options or ir.CompileOptions(
-            self.option('clean'), self.option('optimize'), self.option('debug'), self.option('no-stdlib')
+            self.option('clean'), self.opt_level(), self.option('debug'), self.option('no-stdlib'),
+            self.option('no-cache'), backend, self.jobs(), parser, self.option('shard-functions'),
+            not self.option('no-vectorize'), not self.option('no-slp-vectorize'),
+            self.option_value('target-cpu', 'native'), self.target_features()
         )
         
-        file = ir.File(path, ir.Scope(), options)
-        return compile_to_exe(file)
+        for error in target_errors(*target_cpu(options)):
+            self.error(f"""Usage: gem {action} <file> --target-cpu=<cpu> --target-features=<features>
+Invalid target, {error}""")
+        
+        return ir.File(path, ir.Scope(), options)
@@ -0,0 +1,239 @@
+from dataclasses import dataclass, asdict
+from functools import cache
+from hashlib import sha256
+from os import environ, getpid
+from shutil import move
+from logging import info
+from pathlib import Path
+import pickle
+import json
+
+from llvmlite import binding as llvm, __version__ as llvmlite_version
+
+from gem.ir_serializer import dump_ir, load_ir
+from gem.llvm_backend import target_cpu
+from gem import ir
+
+
+PACKAGE_DIR = Path(__file__).parent
+
+# options that do not change the generated code and therefore are not part of the cache key
+NON_OUTPUT_OPTIONS = {'clean', 'no_cache', 'jobs', 'parser', 'shard_functions'}
+
+
+def default_cache_dir():
+    if (cache_dir := environ.get('GEM_CACHE_DIR')) is not None:
+        return Path(cache_dir)
+
+    return Path.home() / '.cache' / 'gem'
+
+def hash_file(path: Path):
+    return sha256(path.read_bytes()).hexdigest()
+
+@cache
+def compiler_fingerprint(version: str):
+    """Identifies the compiler that produced a cache entry, any change to the compiler's sources invalidates the whole
+    cache"""
+    digest = sha256(f'{version};{llvmlite_version};{llvm.llvm_version_info}'.encode('utf-8'))
+    for path in sorted(PACKAGE_DIR.rglob('*.py')):
+        digest.update(path.relative_to(PACKAGE_DIR).as_posix().encode('utf-8'))
+        digest.update(path.read_bytes())
+
+    return digest.hexdigest()
+
+def write_atomic(path: Path, data: bytes):
+    tmp_path = path.with_name(f'{path.name}.{getpid()}.tmp')
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+
+
+@dataclass
+class PassesEntry:
+    """The result of running the compile passes on a file, the program and the file's scope (symbol table and type map)
+    after all passes have run"""
+
+    program: ir.Program
+    scope: ir.Scope
+    dependencies: dict[str, str]
+
+
+class BuildCache:
+    """Persistent on-disk cache of compiled modules. Entries are content-addressed by the source, the compiler and the
+    compile options so any unchanged module (e.g. the stdlib) is only ever compiled once."""
+
+    def __init__(self, directory: Path, version: str):
+        self.directory = directory
+        self.version = version
+
+        # serialized entries that were already read or written during this run, by path
+        self.loaded: dict[Path, bytes] = {}
+
+    def is_enabled(self, file: ir.File):
+        return not file.options.no_cache and not file.options.debug
+
+    def owns(self, path: Path):
+        return path.is_relative_to(self.directory)
+
+    def key(self, file: ir.File):
+        options = {k: v for k, v in asdict(file.options).items() if k not in NON_OUTPUT_OPTIONS}
+        # `native` is a different CPU on every machine that shares the cache
+        options['target_cpu'], options['target_features'] = target_cpu(file.options)
+        return self.hash(file, options)
+
+    def stage_key(self, file: ir.File, stage: str):
+        # parsing does not depend on the options code is generated with, only on whether the stdlib is used
+        if stage == 'parse':
+            return self.hash(file, {'no_stdlib': file.options.no_stdlib})
+
+        return self.key(file)
+
+    def hash(self, file: ir.File, options: dict):
+        digest = sha256(compiler_fingerprint(self.version).encode('utf-8'))
+        digest.update(file.path.stem.encode('utf-8'))
+        digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+        digest.update(file.path.read_bytes())
+        return digest.hexdigest()
+
+    def entry_path(self, key: str, suffix: str):
+        return self.directory / key[:2] / f'{key}{suffix}'
+
+    def read_entry(self, path: Path):
+        if path in self.loaded:
+            return self.loaded[path]
+
+        if not path.exists():
+            return None
+
+        data = path.read_bytes()
+        self.loaded[path] = data
+        return data
+    
+    def write_entry(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, data)
+        self.loaded[path] = data
+    
+    def load_ir(self, file: ir.File, stage: str):
+        """Loads the IR of the file as it was after a compile stage (e.g. 'parse') from a .girb entry"""
+        if not self.is_enabled(file):
+            return None
+
+        key = self.stage_key(file, stage)
+        data = self.read_entry(self.entry_path(key, f'.{stage}.girb'))
+        if data is None:
+            return None
+
+        try:
+            program = load_ir(data)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+            info(f'Discarding unreadable cache entry {key}.{stage}')
+            return None
+
+        info(f'Loaded {stage} IR of {file.path.as_posix()} from the build cache ({key})')
+        return program
+    
+    def store_ir(self, file: ir.File, stage: str, program: ir.Program):
+        if not self.is_enabled(file):
+            return
+
+        try:
+            data = dump_ir(program)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            info(f'Could not cache {stage} IR of {file.path.as_posix()}: {e}')
+            return
+
+        key = self.stage_key(file, stage)
+        self.write_entry(self.entry_path(key, f'.{stage}.girb'), data)
+
+    def load_passes(self, file: ir.File) -> PassesEntry | None:
+        if not self.is_enabled(file):
+            return None
+
+        key = self.key(file)
+        data = self.read_entry(self.entry_path(key, '.passes.girb'))
+        if data is None:
+            return None
+
+        try:
+            entry = load_ir(data, (PassesEntry,))
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+            info(f'Discarding unreadable cache entry {key}')
+            return None
+
+        for dependency, digest in entry.dependencies.items():
+            path = Path(dependency)
+            if not path.exists() or hash_file(path) != digest:
+                info(f'Cache entry for {file.path.as_posix()} is stale, {path.as_posix()} changed')
+                return None
+
+        info(f'Loaded {file.path.as_posix()} from the build cache ({key})')
+        return entry
+
+    def store_passes(self, file: ir.File, program: ir.Program):
+        if not self.is_enabled(file):
+            return
+
+        dependencies = {path.resolve().as_posix(): hash_file(path) for path in file.scope.dependencies}
+        try:
+            data = dump_ir(PassesEntry(program, file.scope, dependencies))
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            info(f'Could not cache {file.path.as_posix()}: {e}')
+            return
+
+        key = self.key(file)
+        self.write_entry(self.entry_path(key, '.passes.girb'), data)
+
+        info(f'Stored {file.path.as_posix()} in the build cache ({key})')
+
+    def runtime_library(self, triple: str, sources: list[Path], suffix: str):
+        """Returns the path of the C runtime library (archive or shared library) for the target triple, the path changes
+        whenever one of the runtime sources changes"""
+        digest = sha256(triple.encode('utf-8'))
+        for path in sorted(sources):
+            digest.update(path.name.encode('utf-8'))
+            digest.update(path.read_bytes())
+
+        return self.directory / 'runtime' / triple / f'libgemrt-{digest.hexdigest()[:16]}{suffix}'
+
+    def load_object(self, file: ir.File):
+        """Returns the cached object file of the file. The file's scope is restored from the cache and the object files of
+        its dependencies are added to the file's codegen data"""
+        if not self.is_enabled(file):
+            return None
+
+        key = self.key(file)
+        obj_file = self.entry_path(key, '.o')
+        meta_file = self.entry_path(key, '.json')
+        if not obj_file.exists() or not meta_file.exists():
+            return None
+
+        object_files = [Path(path) for path in json.loads(meta_file.read_text('utf-8'))['object_files']]
+        if not all(path.exists() for path in object_files):
+            return None
+
+        entry = self.load_passes(file)
+        if entry is None:
+            return None
+
+        file.scope = entry.scope
+        file.codegen_data.object_files.extend(object_files)
+        info(f'Loaded object file of {file.path.as_posix()} from the build cache ({key})')
+        return obj_file
+
+    def store_object(self, file: ir.File, obj_file: Path):
+        """Moves the object file into the cache and returns its new location"""
+        if not self.is_enabled(file) or not obj_file.exists():
+            return obj_file
+
+        key = self.key(file)
+        cached_obj_file = self.entry_path(key, '.o')
+        cached_obj_file.parent.mkdir(parents=True, exist_ok=True)
+        move(obj_file, cached_obj_file)
+        if (bitcode_file := obj_file.with_suffix('.bc')).exists():
+            move(bitcode_file, cached_obj_file.with_suffix('.bc'))
+
+        object_files = [path.as_posix() for path in file.codegen_data.object_files]
+        write_atomic(self.entry_path(key, '.json'), json.dumps({'object_files': object_files}).encode('utf-8'))
+
+        info(f'Stored object file of {file.path.as_posix()} in the build cache ({key})')
+        return cached_obj_file
@@ -4,6 +4,7 @@ from logging import info
 
 from llvmlite import ir as lir
 
+from gem.codegen_utils import add_function_attributes
 from gem import ir
 
 
@@ -14,6 +15,8 @@ class UnknownCObject(Exception):
 class CFunction:
     func_type: lir.FunctionType
     llvm_name: Optional[str] = None
+    # LLVM attributes of the declaration
+    attributes: tuple[str, ...] = ()
 
 @dataclass
 class CGlobal:
@@ -49,9 +52,10 @@ class CRegistry:
             'puts': CFunction(lir.FunctionType(lir.VoidType(), [
                 lir.PointerType(lir.IntType(8))
             ])),
+            # calls to exit are only on the path of a panic, which are kept out of the way of the rest of the code
             'exit': CFunction(lir.FunctionType(lir.VoidType(), [
                 lir.IntType(32)
-            ])),
+            ]), attributes=('noreturn', 'cold', 'nounwind')),
             'snprintf': CFunction(lir.FunctionType(lir.IntType(32), [
                 lir.PointerType(lir.IntType(8)),
                 lir.IntType(32),
@@ -109,6 +113,7 @@ class CRegistry:
 
         func = lir.Function(self.module, cfunc.func_type, llvm_name)
         func.linkage = 'external'
+        add_function_attributes(func, cfunc.attributes)
 
         return func
     
@@ -93,6 +93,29 @@ def define_identified_type(name: str, types: Iterable[ir.Type], context: ir.Cont
     
     return typ
 
+class FunctionAttributes(ir.FunctionAttributes):
+    """The function attributes of llvmlite and those it does not know, attributes with arguments like `allocsize(0)`
+    are checked by their name. llvmlite has no way to add attributes it does not know other than extending its private
+    `_known`, which is why it is pinned in requirements.txt."""
+    _known = ir.FunctionAttributes._known | frozenset(['willreturn', 'allocsize'])
+    
+    def add(self, name: str):
+        if name.partition('(')[0] in self._known and '(' in name:
+            return set.add(self, name)
+        
+        return super().add(name)
+
+def add_function_attributes(func: ir.Function, attributes: Iterable[str]):
+    """Adds LLVM attributes to a function, `noalias` is added to the pointer it returns"""
+    if not isinstance(func.attributes, FunctionAttributes):
+        func.attributes = FunctionAttributes(func.attributes)
+    
+    for attribute in attributes:
+        if attribute == 'noalias':
+            func.return_value.attributes.add(attribute)
+        else:
+            func.attributes.add(attribute)
+
 def get_ptr(instr: ir.LoadInstr):
     """Get pointer from a load instruction"""
     return instr.operands[0]
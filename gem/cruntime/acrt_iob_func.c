@@ -0,0 +1,16 @@
+#include <stdio.h>
+
+
+#ifndef _WIN32
+// __acrt_iob_func is how the windows C runtime exposes stdin, stdout and stderr - the stdlib uses it to get stdin
+FILE *__acrt_iob_func(unsigned index) {
+    switch (index) {
+        case 0:
+            return stdin;
+        case 1:
+            return stdout;
+        default:
+            return stderr;
+    }
+}
+#endif
@@ -0,0 +1,169 @@
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from llvmlite import ir as lir
+
+from gem.codegen_utils import (
+    NULL, NULL_BYTE, create_static_buffer, create_struct_value, create_string_constant,
+    get_allocated_struct_field_value, get_struct_field, llint, zero
+)
+from gem import ir
+
+
+@dataclass(frozen=True, slots=True)
+class Intrinsic:
+    """A function that is not defined anywhere, the resolver declares it in every file and code generation emits its
+    instructions at each call instead of a call. `emit` is given the code generation pass, the call and the values of
+    its arguments."""
+    name: str
+    ret_type: ir.Type
+    params: list[ir.Param]
+    emit: Callable[[Any, ir.Call, list[Any]], Any]
+
+    def declare(self):
+        # a function of its own for every file because functions defined in a file can be added as overloads to it
+        return ir.Function(ir.Position.zero(), self.ret_type, self.name, self.params)
+
+# callee -> intrinsic, built once when the compiler is imported
+INTRINSICS: dict[str, Intrinsic] = {}
+
+
+def intrinsic(name: str, ret_type: str, *params: tuple[str, str]):
+    """Registers the decorated function as the emitter of an intrinsic, params are (type, name) pairs"""
+    def decorator(emit: Callable[[Any, ir.Call, list[Any]], Any]):
+        INTRINSICS[name] = Intrinsic(name, ir.Type(ret_type), [
+            ir.Param(ir.Position.zero(), ir.Type(typ), param_name) for typ, param_name in params
+        ], emit)
+        return emit
+
+    return decorator
+
+def global_string(codegen, name: str, value: str):
+    if name in codegen.module.globals:
+        return codegen.module.get_global(name)
+
+    return create_string_constant(codegen.module, value, name, codegen.builder)
+
+@intrinsic('panic', 'nil', ('pointer', 'msg'))
+def panic(codegen, node: ir.Call, args: list[Any]):
+    exit = codegen.c_registry.get('exit')
+    puts = codegen.c_registry.get('puts')
+
+    codegen.builder.call(puts, [args[0]])
+    codegen.builder.call(exit, [llint(1)])
+    return codegen.builder.unreachable()
+
+@intrinsic('__buffer', 'pointer', ('int', 'size'))
+def buffer(codegen, node: ir.Call, args: list[Any]):
+    const = args[0]
+    if not isinstance(const, lir.Constant):
+        node.pos.comptime_error(codegen.file, 'Expected integer constant for __buffer')
+
+    size = const.constant
+    return create_static_buffer(codegen.module, lir.IntType(8), size, '__buffer', codegen.builder)
+
+@intrinsic('__create_string', 'string', ('pointer', 'ptr'), ('int', 'length'))
+def create_string(codegen, node: ir.Call, args: list[Any]):
+    return create_struct_value(codegen.builder, codegen.string_type, args, 'string')
+
+@intrinsic('__format_int', 'int', ('pointer', 'buf'), ('int', 'length'), ('int', 'i'))
+def format_int(codegen, node: ir.Call, args: list[Any]):
+    snprintf = codegen.c_registry.get('snprintf')
+    fmt = global_string(codegen, 'int_fmt', '%d')
+    return codegen.builder.call(snprintf, [args[0], args[1], fmt, args[2]], '__format_int')
+
+@intrinsic('__format_float', 'int', ('pointer', 'buf'), ('int', 'length'), ('float', 'f'))
+def format_float(codegen, node: ir.Call, args: list[Any]):
+    snprintf = codegen.c_registry.get('snprintf')
+    fmt = global_string(codegen, 'float_fmt', '%f')
+    return codegen.builder.call(snprintf, [args[0], args[1], fmt, args[2]], '__format_float')
+
+@intrinsic('string.ptr', 'pointer', ('string', 'str'))
+def string_ptr(codegen, node: ir.Call, args: list[Any]):
+    string = args[0]
+    if isinstance(getattr(string, 'type'), lir.PointerType):
+        return get_allocated_struct_field_value(codegen.builder, string, 0, 'string.ptr')
+
+    return get_struct_field(codegen.builder, string, 0, 'string.ptr')
+
+@intrinsic('__null_terminate', 'nil', ('pointer', 'ptr'), ('int', 'position'))
+def null_terminate(codegen, node: ir.Call, args: list[Any]):
+    ptr, position = args
+    last_char_ptr = codegen.builder.gep(ptr, [position], True, 'last_char_ptr')
+    return codegen.builder.store(NULL_BYTE(), last_char_ptr)
+
+@intrinsic('__stdin', 'FILE')
+def stdin(codegen, node: ir.Call, args: list[Any]):
+    acrt_iob_func = codegen.c_registry.get('__acrt_iob_func')
+    return codegen.builder.call(acrt_iob_func, [llint(0)], '__stdin')
+
+@intrinsic('__print_pointer_no_newline', 'nil', ('pointer', 'ptr'))
+def print_pointer_no_newline(codegen, node: ir.Call, args: list[Any]):
+    printf = codegen.c_registry.get('printf')
+
+    string_fmt_name = 'string_fmt'
+    if string_fmt_name in codegen.module.globals:
+        string_fmt = codegen.module.get_global(string_fmt_name)
+    else:
+        string_fmt = create_string_constant(codegen.module, '%s', string_fmt_name)
+
+    return codegen.builder.call(printf, [string_fmt, args[0]])
+
+@intrinsic('__is_null', 'bool', ('pointer', 'ptr'))
+def is_null(codegen, node: ir.Call, args: list[Any]):
+    return codegen.builder.icmp_signed('==', args[0], NULL(), '__is_null')
+
+@intrinsic('__oom_msg', 'pointer')
+def oom_msg(codegen, node: ir.Call, args: list[Any]):
+    out_of_memory_msg_name = '__oom_str'
+    if out_of_memory_msg_name in codegen.module.globals:
+        return lir.Constant.gep(codegen.module.get_global(out_of_memory_msg_name), [zero(32), zero(32)])
+
+    return create_string_constant(codegen.module, 'out of memory', out_of_memory_msg_name)
+
+@intrinsic('string.length', 'int', ('string', 's'))
+def string_length(codegen, node: ir.Call, args: list[Any]):
+    string = args[0]
+    if isinstance(getattr(string, 'type'), lir.PointerType):
+        return get_allocated_struct_field_value(codegen.builder, string, 1, 'string.length')
+
+    return get_struct_field(codegen.builder, string, 1, 'string.length')
+
+@intrinsic('__null', 'pointer')
+def null(codegen, node: ir.Call, args: list[Any]):
+    return NULL()
+
+def op_intrinsic(op: str, ret_type: str, operand_type: str, method: str, compares: bool = False):
+    """Registers the binary operator `op` on two values of operand_type, emitted as the IRBuilder method of that name"""
+    name = ir.operator_callee(op, ir.Type(operand_type), ir.Type(operand_type))
+
+    def emit(codegen, node: ir.Call, args: list[Any]):
+        instruction = getattr(codegen.builder, method)
+        if compares:
+            return instruction(op, args[0], args[1], name)
+
+        return instruction(args[0], args[1], name)
+
+    intrinsic(name, ret_type, (operand_type, 'a'), (operand_type, 'b'))(emit)
+
+for op, method in {'+': 'add', '-': 'sub', '*': 'mul', '/': 'sdiv', '%': 'srem'}.items():
+    op_intrinsic(op, 'int', 'int', method)
+
+for op in ('==', '!=', '>', '<', '>=', '<='):
+    op_intrinsic(op, 'bool', 'int', 'icmp_signed', compares=True)
+
+for op, method in {'+': 'fadd', '-': 'fsub', '*': 'fmul', '/': 'fdiv', '%': 'frem'}.items():
+    op_intrinsic(op, 'float', 'float', method)
+
+for op in ('==', '!=', '>', '<', '>=', '<='):
+    op_intrinsic(op, 'bool', 'float', 'fcmp_ordered', compares=True)
+
+for op in ('==', '!='):
+    op_intrinsic(op, 'bool', 'bool', 'icmp_signed', compares=True)
+
+for op, method in {'&&': 'and_', '||': 'or_'}.items():
+    op_intrinsic(op, 'bool', 'bool', method)
+
+@intrinsic(ir.operator_callee('!', ir.Type('bool')), 'bool', ('bool', 'a'))
+def not_bool(codegen, node: ir.Call, args: list[Any]):
+    return codegen.builder.not_(args[0], '!.bool')
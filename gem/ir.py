@@ -1,9 +1,14 @@
-from dataclasses import dataclass, field
+from concurrent.futures import Future
+from functools import cache
+from threading import Lock
+from dataclasses import dataclass, field, fields
 from typing import Optional, Any, Union
-from abc import ABC, abstractmethod
+from abc import ABC, ABCMeta, abstractmethod
 from sys import exit as sys_exit
 from logging import error, info
 from pathlib import Path
+from os import cpu_count
+from contextlib import contextmanager
 from copy import copy
 
 from colorama import Fore, Style
@@ -12,16 +17,33 @@ from colorama import Fore, Style
 STDLIB_PATH = Path(__file__).parent / 'stdlib'
 
 def no_type():
-    return Type('any')
+    return ANY_TYPE
 
-@dataclass(unsafe_hash=True)
-class Position:
-    line: int
-    column: int
+class Position(int):
+    """A source position packed into a single int, `line << 16 | column`"""
+    
+    __slots__ = ()
+    
+    def __new__(cls, line: int, column: int):
+        return super().__new__(cls, line << 16 | min(column, 0xFFFF))
+    
+    def __getnewargs__(self):
+        return self.line, self.column
+    
+    @property
+    def line(self):
+        return self >> 16
+    
+    @property
+    def column(self):
+        return self & 0xFFFF
+    
+    def __repr__(self):
+        return f'Position(line={self.line}, column={self.column})'
     
     @staticmethod
     def zero():
-        return Position(0, 0)
+        return ZERO_POSITION
 
     def comptime_error(self, file: 'File', message: str):
         src = file.path.read_text('utf-8')
@@ -35,6 +57,8 @@ class Position:
         
         sys_exit(1)
 
+ZERO_POSITION = Position(0, 0)
+
 @dataclass
 class Symbol:
     name: str
@@ -45,40 +69,99 @@ class Symbol:
 
 @dataclass
 class SymbolTable:
+    """Symbols of a scope. All tables of a scope chain share one dict of name -> tables defining that name, ordered from
+    the outermost to the innermost, so looking a name up does not depend on how deeply the scope is nested. A table is
+    only visible from itself and its children, `close` removes it from the shared dict when its scope ends."""
+    
     symbols: dict[str, Symbol] = field(default_factory=dict)
     parent: Union['SymbolTable', None] = None
+    bindings: dict[str, list['SymbolTable']] = field(init=False, repr=False, compare=False)
+    chain: tuple['SymbolTable', ...] = field(init=False, repr=False, compare=False)
+    depth: int = field(init=False, repr=False, compare=False)
     
-    def get(self, name: str):
-        if self.parent is not None and (symbol := self.parent.get(name)) is not None:
-            return symbol
+    def __post_init__(self):
+        if self.parent is not None:
+            self.bindings = self.parent.bindings
+            self.chain = self.parent.chain + (self,)
+        else:
+            self.bindings = {}
+            self.chain = (self,)
+        
+        self.depth = len(self.chain) - 1
+        for name in self.symbols:
+            self.bind(name)
+    
+    def bind(self, name: str):
+        tables = self.bindings.setdefault(name, [])
+        i = len(tables)
+        while i > 0 and tables[i - 1].depth > self.depth:
+            i -= 1
         
-        return self.symbols.get(name)
+        tables.insert(i, self)
+    
+    def unbind(self, name: str):
+        tables = self.bindings[name]
+        tables.remove(self)
+        if len(tables) == 0:
+            del self.bindings[name]
+    
+    def owner(self, name: str):
+        """The innermost table visible from this one that defines `name`"""
+        tables = self.bindings.get(name)
+        if tables is None:
+            return None
+        
+        chain, depth = self.chain, self.depth
+        for table in reversed(tables):
+            if table.depth <= depth and chain[table.depth] is table:
+                return table
+        
+        return None
+    
+    def get(self, name: str):
+        table = self.owner(name)
+        return table.symbols[name] if table is not None else None
     
     def add(self, symbol: Symbol):
+        if symbol.name not in self.symbols:
+            self.bind(symbol.name)
+        
         self.symbols[symbol.name] = symbol
     
     def has(self, name: str):
-        if self.parent is not None and self.parent.has(name):
-            return True
-        
-        return name in self.symbols
+        return self.owner(name) is not None
                  
     def remove(self, name: str):
-        if self.parent is not None and self.parent.has(name):
-            return self.parent.remove(name)
-        
-        if self.has(name):
-            del self.symbols[name]
-            return True
+        # removes the outermost definition, like it was always done
+        chain, depth = self.chain, self.depth
+        for table in self.bindings.get(name, ()):
+            if table.depth <= depth and chain[table.depth] is table:
+                del table.symbols[name]
+                table.unbind(name)
+                return True
         
         return False
     
     def merge(self, other: 'SymbolTable'):
-        self.symbols.update(other.symbols)
+        for symbol in other.symbols.values():
+            self.add(symbol)
+    
+    def close(self):
+        for name in self.symbols:
+            self.unbind(name)
                  
 @dataclass
 class TypeMap:
+    """Types of a scope by name. Cloning shares the dict between both maps and whichever is changed first copies it, so
+    child scopes that don't define types never copy it"""
+    
     types: dict[str, 'Type'] = field(default_factory=dict)
+    shared: bool = field(default=False, repr=False, compare=False)
+    
+    def unshare(self):
+        if self.shared:
+            self.types = self.types.copy()
+            self.shared = False
     
     def tryget(self, name: str):
         return self.types.get(name)
@@ -87,9 +170,11 @@ class TypeMap:
         return self.types[name]
                  
     def add(self, type: str):
+        self.unshare()
         self.types[type] = Type(type)
     
     def add_type(self, display: str, typ: 'Type'):
+        self.unshare()
         self.types[display] = typ
     
     def has(self, name: str):
@@ -97,24 +182,38 @@ class TypeMap:
                  
     def remove(self, name: str):
         if self.has(name):
+            self.unshare()
             del self.types[name]
     
     def clone(self):
-        return TypeMap(self.types.copy())
+        self.shared = True
+        return TypeMap(self.types, shared=True)
     
     def merge(self, other: 'TypeMap'):
+        self.unshare()
         self.types.update(other.types)
 
 @dataclass
 class CodegenData:
     object_files: list[Path] = field(default_factory=list)
+    pending_object_files: list[Future[Path]] = field(default_factory=list)
+    
+    def wait_for_object_files(self):
+        self.object_files.extend(future.result() for future in self.pending_object_files)
+        self.pending_object_files.clear()
+    
+    def library_bitcode(self):
+        """The bitcode of the libraries whose object files are linked in, written next to their object files"""
+        bitcode_files = (obj_file.with_suffix('.bc') for obj_file in self.object_files)
+        return [bitcode_file.read_bytes() for bitcode_file in bitcode_files if bitcode_file.exists()]
 
 @dataclass
 class Scope:
     parent: Optional['Scope'] = None
-    symbol_table: SymbolTable = field(default_factory=SymbolTable)
-    type_map: TypeMap = field(default_factory=TypeMap)
-    dependencies: list[Path] = field(default_factory=list)
+    # created in __post_init__, child scopes share or chain to the ones of their parent
+    symbol_table: SymbolTable = None # type: ignore
+    type_map: TypeMap = None # type: ignore
+    dependencies: list[Path] = None # type: ignore
     body_nodes: list['Node'] = field(default_factory=list)
 
     def __post_init__(self):
@@ -124,6 +223,10 @@ class Scope:
             
             self.dependencies = self.parent.dependencies
         else:
+            self.symbol_table = SymbolTable()
+            self.type_map = TypeMap()
+            self.dependencies = []
+            
             # basic types
             self.type_map.add('int')
             self.type_map.add('float')
@@ -143,13 +246,28 @@ class Scope:
 
     def make_child(self) -> 'Scope':
         return Scope(self)
+    
+    def close(self):
+        self.symbol_table.close()
 
 @dataclass
 class CompileOptions:
     clean: bool = False
-    optimize: bool = False
+    # -O0, -O1, -O2, -O3 or -Os, --optimize is -O2
+    opt_level: str = '0'
     debug: bool = False
     no_stdlib: bool = False
+    no_cache: bool = False
+    backend: str = 'llvmlite'
+    jobs: int = field(default_factory=lambda: cpu_count() or 1)
+    parser: str = 'native'
+    shard_functions: bool = False
+    vectorize: bool = True
+    slp_vectorize: bool = True
+    # the CPU code is generated for, `native` is the CPU the compiler runs on
+    target_cpu: str = 'native'
+    # LLVM features like `+avx2,-fma` added to the ones of the target CPU
+    target_features: str = ''
 
 @dataclass
 class File:
@@ -169,13 +287,37 @@ class File:
     @property
     def unique_name(self):
         self._unique_name_idx += 1
-        return f'_{self._unique_name_idx}'
+        return f'_{self._unique_name_prefix}{self._unique_name_idx}'
+    
+    @contextmanager
+    def unique_name_scope(self, name: str):
+        """Unique names made inside the block are `_<name>.<n>` counting from 0, so they only depend on the code in the
+        block and not on what was compiled before it. Functions are given their own scope so that they can be compiled in
+        any order or in different processes and still get the same names."""
+        old_prefix, old_idx = self._unique_name_prefix, self._unique_name_idx
+        self._unique_name_prefix, self._unique_name_idx = f'{name}.', -1
+        yield
+        self._unique_name_prefix, self._unique_name_idx = old_prefix, old_idx
     
     def __post_init__(self):
+        self._unique_name_prefix = ''
         self._unique_name_idx = -1
 
 
-@dataclass(unsafe_hash=True)
+@cache
+def init_field_names(cls: type) -> tuple[str, ...]:
+    """Names of the fields of a node class that are passed to its constructor, in the order of its parameters"""
+    return tuple(field.name for field in fields(cls) if field.init)
+
+def unchanged(old: Any, new: Any):
+    """Whether a field value produced by a pass is the value the field already had, lists are unchanged when they hold
+    the same nodes"""
+    if new is old:
+        return True
+    
+    return type(new) is list and type(old) is list and len(new) == len(old) and all(a is b for a, b in zip(new, old))
+
+@dataclass(unsafe_hash=True, slots=True)
 class Node(ABC):
     pos: Position
     type: 'Type'
@@ -189,23 +331,88 @@ class Node(ABC):
     
     def clone(self) -> 'Node':
         return copy(self)
+    
+    def replace(self, **changes):
+        """Returns this node when every value in `changes` is unchanged, otherwise a new node with the changes applied.
+        Passes build their result with this so that subtrees a pass doesn't change are reused instead of copied."""
+        for name, value in changes.items():
+            if not unchanged(getattr(self, name), value):
+                break
+        else:
+            return self
+        
+        return type(self)(*[
+            changes[name] if name in changes else getattr(self, name) for name in init_field_names(type(self))
+        ])
+
+class InternedType(ABCMeta):
+    """Metaclass of the IR types, creating a type that was created before returns the same instance so every type is
+    only stored once however many nodes use it. Every type also gets a small integer id in the order it was created,
+    types are compared by identity and hashed by their id."""
+    
+    instances: dict[tuple[type, Any], 'Type'] = {}
+    lock = Lock()
+    
+    def __call__(cls, *args, **kwargs):
+        key = (cls, args[0] if args else kwargs['type'])
+        if (instance := InternedType.instances.get(key)) is None:
+            with InternedType.lock:
+                if (instance := InternedType.instances.get(key)) is None:
+                    instance = super().__call__(*args, **kwargs)
+                    instance.type_id = len(InternedType.instances)
+                    InternedType.instances[key] = instance
+        
+        return instance
 
-@dataclass(unsafe_hash=True)
-class Type(Node):
-    pos: Position = field(default_factory=Position.zero, init=False)
+@dataclass(eq=False, slots=True)
+class Type(Node, metaclass=InternedType):
+    pos: Position = field(default=ZERO_POSITION, init=False)
     type: str #type: ignore
+    type_id: int = field(default=-1, init=False, repr=False)
     
     def __str__(self) -> str:
         return self.type
+    
+    def __eq__(self, other):
+        return self is other
+    
+    def __hash__(self):
+        return self.type_id
+    
+    def __copy__(self):
+        return self
+    
+    def __deepcopy__(self, memo):
+        return self
+    
+    def clone(self):
+        # types are interned and never modified
+        return self
 
-@dataclass(unsafe_hash=True)
+@dataclass(eq=False, slots=True)
 class ReferenceType(Type):
     type: Type # type: ignore
     
     def __str__(self):
         return f'{self.type}&'
 
-@dataclass
+@cache
+def operator_callee(op: str, left: Type, right: Type | None = None) -> str:
+    """Name of the function implementing `op` for operands of the given types, cached by the ids of the types so the name
+    is only built once"""
+    if right is None:
+        return f'{op}.{left}'
+    
+    return f'{left}.{op}.{right}'
+
+@cache
+def member_callee(typ: Type, name: str) -> str:
+    """Name of the method `name` of `typ`"""
+    return f'{typ}.{name}'
+
+ANY_TYPE = Type('any')
+
+@dataclass(slots=True)
 class Program(Node):
     type: Type = field(default_factory=no_type, init=False)
     nodes: list[Node] = field(default_factory=list)
@@ -213,7 +420,7 @@ class Program(Node):
     def __str__(self) -> str:
         return '\n'.join(str(node) for node in self.nodes)
 
-@dataclass
+@dataclass(slots=True)
 class Param(Node):
     name: str
     is_mutable: bool = False
@@ -221,29 +428,65 @@ class Param(Node):
     def __str__(self) -> str:
         return f'{self.type} {self.name}'
 
-@dataclass
+@dataclass(slots=True)
 class Arg(Node):
     value: Any
     
     def __str__(self) -> str:
         return f'{self.value}'
 
-@dataclass
+@dataclass(slots=True)
 class Body(Node):
     nodes: list[Node] = field(default_factory=list)
     
     def __str__(self) -> str:
         return '\n'.join(str(node) for node in self.nodes)
 
-@dataclass(kw_only=True)
+# function attributes given through FunctionFlags (by `lib.builtin` or STDLIB_ATTRIBUTES) by the numbers of arguments
+# they take. They are the LLVM attributes of the same name except `noalias`, which is added to the returned pointer.
+FUNCTION_ATTRIBUTES = {
+    'nounwind': (0,), 'willreturn': (0,), 'norecurse': (0,), 'readonly': (0,), 'readnone': (0,), 'noreturn': (0,),
+    'cold': (0,), 'inlinehint': (0,), 'noinline': (0,), 'alwaysinline': (0,), 'noalias': (0,), 'allocsize': (1, 2)
+}
+
+@dataclass(frozen=True, slots=True)
+class FunctionAttribute:
+    name: str
+    args: tuple[int, ...] = ()
+    
+    def __str__(self) -> str:
+        if len(self.args) == 0:
+            return self.name
+        
+        args_str = ', '.join(str(arg) for arg in self.args)
+        return f'{self.name}({args_str})'
+
+# attributes of the functions of the gem files in the stdlib, by library and function name
+STDLIB_ATTRIBUTES = {
+    'core': {
+        'gem_alloc': (FunctionAttribute('noalias'), FunctionAttribute('allocsize', (0,)), FunctionAttribute('norecurse')),
+        'gem_realloc': (
+            FunctionAttribute('noalias'), FunctionAttribute('allocsize', (1,)), FunctionAttribute('norecurse')
+        ),
+        'gem_zalloc': (
+            FunctionAttribute('noalias'), FunctionAttribute('allocsize', (0, 1)), FunctionAttribute('norecurse')
+        ),
+        'string.to_string': (
+            FunctionAttribute('readnone'), FunctionAttribute('willreturn'), FunctionAttribute('norecurse')
+        )
+    }
+}
+
+@dataclass(kw_only=True, slots=True)
 class FunctionFlags:
     static: bool = False
     property: bool = False
     method: bool = False
     extern: bool = False
+    attributes: tuple[FunctionAttribute, ...] = ()
     
     def __str__(self) -> str:
-        flags = ''
+        flags = ''.join(f'@{attribute} ' for attribute in self.attributes)
         if self.static:
             flags += 'static '
         
@@ -258,7 +501,7 @@ class FunctionFlags:
         
         return flags
 
-@dataclass
+@dataclass(slots=True)
 class Function(Node):
     name: str
     params: list[Param] = field(default_factory=list)
@@ -267,6 +510,8 @@ class Function(Node):
     flags: FunctionFlags = field(default_factory=FunctionFlags)
     extend_type: Type | None = None
     generic_params: list[str] = field(default_factory=list)
+    # the functions a generic function is resolved to for each set of type arguments it is called with
+    instances: list['Function'] = field(default_factory=list)
     
     @property
     def ret_type(self):
@@ -290,7 +535,7 @@ class Function(Node):
             if isinstance(arg_type, ReferenceType):
                 arg_type = arg_type.type
             
-            if str(arg_type) != str(param_type) and param_type.type != 'any' and param_type.type not in self.generic_params:
+            if arg_type is not param_type and param_type is not ANY_TYPE and param_type.type not in self.generic_params:
                 info(f'Type mismatch: arg type {arg_type} does not match param type {param_type}')
                 return False
         
@@ -311,23 +556,68 @@ class Function(Node):
     def call(self, pos: Position, args: list[Arg]):
         return Call(pos, self.ret_type, self.name, args)
     
-    def replace_generic(self, type: Type, generic_map: dict[str, Type]):
-        if str(type) not in generic_map:
-            return type
-        
-        return generic_map[str(type)]
+    def replace_generic(self, type: Type, generic_map: dict[Type, Type]):
+        return generic_map.get(type, type)
     
     def create_generic_map(self, args: list[Arg]):
-        generic_map = {}
+        generic_map: dict[Type, Type] = {}
         for param, arg in zip(self.params, args):
-            if str(param.type) not in self.generic_params:
+            if isinstance(param.type, ReferenceType) or param.type.type not in self.generic_params:
                 continue
             
-            generic_map[str(param.type)] = arg.type
+            generic_map[param.type] = arg.type
         
         return generic_map
+    
+    @property
+    def has_exact_params(self):
+        """Whether only arguments of exactly the types of the parameters match, which is not the case when one of them
+        is `any` or a generic parameter"""
+        for param in self.params:
+            param_type = unreferenced(param.type)
+            if param_type is ANY_TYPE or param_type.type in self.generic_params:
+                return False
+        
+        return True
 
-@dataclass
+def unreferenced(type: Type):
+    return type.type if isinstance(type, ReferenceType) else type
+
+def signature(types) -> tuple[Type, ...]:
+    return tuple(unreferenced(type) for type in types)
+
+class OverloadIndex:
+    """The overloads of a function, and the function itself after them, by the types of their parameters. Overloads
+    whose parameters are not exact can match more than one signature so they are still checked one by one, the first
+    overload in order that matches is found like when all of them are checked."""
+    
+    def __init__(self, func: Function):
+        self.func = func
+        self.count = len(func.overloads)
+        self.exact: dict[tuple[Type, ...], tuple[int, Function]] = {}
+        self.inexact: list[tuple[int, Function]] = []
+        for i, overload in enumerate(func.overloads + [func]):
+            if overload.has_exact_params:
+                self.exact.setdefault(signature(param.type for param in overload.params), (i, overload))
+            else:
+                self.inexact.append((i, overload))
+    
+    def is_current(self, func: Function):
+        # overloads are only ever appended to a function
+        return self.func is func and self.count == len(func.overloads)
+    
+    def find(self, args: list[Arg]) -> Function | None:
+        match = self.exact.get(signature(arg.type for arg in args))
+        for i, overload in self.inexact:
+            if match is not None and i > match[0]:
+                break
+            
+            if overload.match_params(args):
+                return overload
+        
+        return match[1] if match is not None else None
+
+@dataclass(slots=True)
 class Variable(Node):
     name: str
     value: Node
@@ -341,7 +631,7 @@ class Variable(Node):
         mut_str = 'mut' if self.is_mutable else ''
         return f'{mut_str}{self.type} {self.name} = {self.value}'
 
-@dataclass
+@dataclass(slots=True)
 class Assignment(Node):
     name: str
     value: Node
@@ -351,7 +641,7 @@ class Assignment(Node):
         op_str = self.op if self.op is not None else ''
         return f'{self.name} {op_str}= {self.value}'
 
-@dataclass
+@dataclass(slots=True)
 class Elseif(Node):
     type: Type = field(default_factory=no_type, init=False)
     cond: Node
@@ -362,7 +652,7 @@ class Elseif(Node):
 {self.body}
 }}"""
 
-@dataclass
+@dataclass(slots=True)
 class If(Node):
     type: Type = field(default_factory=no_type, init=False)
     cond: Node
@@ -376,7 +666,7 @@ class If(Node):
 {self.body}
 }}{elseifs_str}{self.else_body if self.else_body is not None else ''}"""
 
-@dataclass
+@dataclass(slots=True)
 class While(Node):
     type: Type = field(default_factory=no_type, init=False)
     cond: Node
@@ -387,21 +677,21 @@ class While(Node):
 {self.body}
 }}"""
 
-@dataclass
+@dataclass(slots=True)
 class Break(Node):
     type: Type = field(default_factory=no_type, init=False)
     
     def __str__(self) -> str:
         return 'break'
 
-@dataclass
+@dataclass(slots=True)
 class Continue(Node):
     type: Type = field(default_factory=no_type, init=False)
     
     def __str__(self) -> str:
         return 'continue'
 
-@dataclass
+@dataclass(slots=True)
 class Use(Node):
     type: Type = field(default_factory=no_type, init=False)
     path: str
@@ -409,49 +699,49 @@ class Use(Node):
     def __str__(self) -> str:
         return f'use "{self.path}"'
 
-@dataclass
+@dataclass(slots=True)
 class Return(Node):
     value: Node
     
     def __str__(self) -> str:
         return f'return {self.value}'
 
-@dataclass
+@dataclass(slots=True)
 class Int(Node):
     value: int
     
     def __str__(self) -> str:
         return f'{self.value}'
 
-@dataclass
+@dataclass(slots=True)
 class Float(Node):
     value: float
     
     def __str__(self) -> str:
         return f'{self.value}'
 
-@dataclass
+@dataclass(slots=True)
 class String(Node):
     value: str
     
     def __str__(self) -> str:
         return f'"{self.value}"'
 
-@dataclass
+@dataclass(slots=True)
 class StringLiteral(Node):
     value: str
     
     def __str__(self) -> str:
         return f'str_lit("{self.value}")'
 
-@dataclass
+@dataclass(slots=True)
 class Bool(Node):
     value: bool
     
     def __str__(self) -> str:
         return f'{str(self.value).lower()}'
 
-@dataclass
+@dataclass(slots=True)
 class Id(Node):
     name: str
     
@@ -461,7 +751,7 @@ class Id(Node):
     def __str__(self) -> str:
         return self.name
 
-@dataclass
+@dataclass(slots=True)
 class Ternary(Node):
     cond: Node
     true: Node
@@ -470,14 +760,14 @@ class Ternary(Node):
     def __str__(self) -> str:
         return f'{self.true} if {self.cond} else {self.false}'
 
-@dataclass
+@dataclass(slots=True)
 class Bracketed(Node):
     value: Node
     
     def __str__(self) -> str:
         return f'({self.value})'
 
-@dataclass
+@dataclass(slots=True)
 class Call(Node):
     callee: str
     args: list[Arg] = field(default_factory=list)
@@ -486,14 +776,14 @@ class Call(Node):
         args_str = ', '.join(str(arg) for arg in self.args)
         return f'{self.callee}({args_str})'
 
-@dataclass
+@dataclass(slots=True)
 class Cast(Node):
     value: Node
     
     def __str__(self) -> str:
         return f'({self.value})'
 
-@dataclass
+@dataclass(slots=True)
 class New(Node):
     new_type: Type
     args: list[Arg] = field(default_factory=list)
@@ -502,7 +792,7 @@ class New(Node):
         args_str = ', '.join(str(arg) for arg in self.args)
         return f'new {self.new_type}({args_str})'
 
-@dataclass
+@dataclass(slots=True)
 class Operation(Node):
     op: str
     left: Node
@@ -511,7 +801,7 @@ class Operation(Node):
     def __str__(self) -> str:
         return f'{self.left} {self.op} {self.right}'
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOperation(Node):
     op: str
     value: Node
@@ -519,7 +809,7 @@ class UnaryOperation(Node):
     def __str__(self) -> str:
         return f'{self.op}{self.value}'
 
-@dataclass
+@dataclass(slots=True)
 class Attribute(Node):
     value: Node
     attr: str
@@ -532,7 +822,7 @@ class Attribute(Node):
         args_str = ', '.join(str(arg) for arg in self.args)
         return f'{self.value}.{self.attr}({args_str})'
 
-@dataclass
+@dataclass(slots=True)
 class Ref(Node):
     name: str
     
@@ -546,14 +836,14 @@ class Ref(Node):
     def __str__(self):
         return f'&{self.name}'
 
-@dataclass
+@dataclass(slots=True)
 class Deref:
     name: str
     
     def __str__(self) -> str:
         return f'*{self.name}'
 
-@dataclass
+@dataclass(slots=True)
 class Comment(Node):
     type: Type = field(default_factory=no_type, init=False)
     text: str
@@ -1,208 +1,453 @@
-from antlr4.error.ErrorListener import ErrorListener as ANTLRErrorListener
-from antlr4 import InputStream, CommonTokenStream
-from antlr4.Token import CommonToken
+from typing import Callable, Any
 
 from gem.passes.code_generation import code_type_to_ir_type
-from gem.parser.GemVisitor import GemVisitor
-from gem.parser.GemParser import GemParser
-from gem.parser.GemLexer import GemLexer
+from gem.lexer import Token, tokenize
 from gem.c_registry import CRegistry
 from gem import ir
 
 
-class ErrorListener(ANTLRErrorListener):
-    def __init__(self, file: ir.File):
-        self.file = file
-    
-    def syntaxError(self, recognizer, offendingSymbol: CommonToken, line: int, column: int, msg, e):
-        pos = ir.Position(line, column)
-        pos.comptime_error(self.file, f'invalid syntax \'{offendingSymbol.text}\'')
+PARSERS = ('native', 'antlr')
+
+ASSIGN_OPS = {'ADD', 'SUB', 'MUL', 'DIV', 'MOD'}
+EXPR_START = {'LPAREN', 'ID', 'INT', 'FLOAT', 'STRING', 'BOOL', 'NEW', 'NOT', 'SUB', 'ADD'}
+
+# binary operators and their precedence in the left-recursive expr rule of Gem.g4, the ternary has precedence 7 and
+# attributes 6. Unary operators parse their operand at precedence 1 and casts at 16, exactly like the ANTLR parser.
+BINARY_OPS = {
+    'MUL': 5, 'DIV': 5, 'MOD': 5,
+    'ADD': 4, 'SUB': 4,
+    'EEQ': 3, 'NEQ': 3, 'GT': 3, 'LT': 3, 'GTE': 3, 'LTE': 3,
+    'AND': 2, 'OR': 2
+}
+TERNARY_PRECEDENCE = 7
+ATTR_PRECEDENCE = 6
+UNARY_PRECEDENCE = 1
+CAST_PRECEDENCE = 16
+
+
+class ParseError(Exception):
+    def __init__(self, token: Token, index: int):
+        super().__init__(token.text)
+        self.token = token
+        self.index = index
+
+        # set when the failed alternative got further than any other alternative could, see IRBuilder.call_args
+        self.committed = False
+
+class IRBuilder:
+    """Recursive-descent parser for Gem.g4 that builds the IR directly from the tokens. It makes the same choices as the
+    ANTLR parser generated from the grammar (precedences, cast vs bracketed expression, ternary vs if statement) and
+    reports the same syntax errors. Where the grammar needs more than a few tokens of lookahead the parser speculates and
+    rewinds."""
 
-class IRBuilder(GemVisitor):
     def __init__(self, file: ir.File):
         self.file = file
-    
-    def pos(self, ctx):
-        return ir.Position(ctx.start.line, ctx.start.column)
-    
+        self.tokens: list[Token] = []
+        self.index = 0
+
+        # speculative parses that failed after getting further than the alternative that was used instead, as
+        # (start index, index of the failing token, failing token). ANTLR would have predicted those and failed there.
+        self.speculation_errors: list[tuple[int, int, Token]] = []
+        self.extern_error: tuple[ir.Position, str] | None = None
+
     def build(self):
-        lexer = GemLexer(InputStream(self.file.path.read_text('utf-8')))
-        parser = GemParser(CommonTokenStream(lexer))
-        parser.removeErrorListeners()
-        parser.addErrorListener(ErrorListener(self.file))
-        return self.visitProgram(parser.program())
-    
-    def visitProgram(self, ctx):
-        return ir.Program(self.pos(ctx), [self.visit(stmt) for stmt in ctx.stmt()])
-    
-    def visitType(self, ctx):
-        if ctx.AMPERSAND() is not None:
-            return ir.ReferenceType(self.visitType(ctx.type_()))
-        
-        return ir.Type(ctx.getText())
-    
-    def visitArgs(self, ctx):
-        return [self.visitArg(arg) for arg in ctx.arg()] if ctx is not None else []
-    
-    def visitArg(self, ctx):
-        value = self.visit(ctx.expr())
-        return ir.Arg(self.pos(ctx), value.type, value)
-    
-    def visitReturn(self, ctx):
-        expr = self.visit(ctx.expr())
-        return ir.Return(self.pos(ctx), expr.type, expr)
-    
-    def visitBreak(self, ctx):
-        return ir.Break(self.pos(ctx))
-    
-    def visitContinue(self, ctx):
-        return ir.Continue(self.pos(ctx))
-    
-    def visitBody(self, ctx):
-        return ir.Body(
-            self.pos(ctx), ir.Type('any'),
-            [self.visit(stmt) for stmt in ctx.bodyStmts()]
-        )
-    
-    def visitParams(self, ctx):
-        return [self.visitParam(param) for param in ctx.param()] if ctx is not None else []
-    
-    def visitParam(self, ctx):
-        return ir.Param(
-            self.pos(ctx), self.visitType(ctx.type_()), ctx.ID().getText(),
-            ctx.MUTABLE() is not None
+        self.tokens = tokenize(self.file.path.read_text('utf-8'))
+        self.index = 0
+        try:
+            program = self.program()
+        except ParseError as e:
+            pos = ir.Position(e.token.line, e.token.column)
+            pos.comptime_error(self.file, f'invalid syntax \'{e.token.text}\'')
+
+        # the ANTLR parser only visits the parse tree after the whole file parsed, so syntax errors take priority
+        if self.extern_error is not None:
+            pos, message = self.extern_error
+            pos.comptime_error(self.file, message)
+
+        return program
+
+    def pos(self, token: Token):
+        return ir.Position(token.line, token.column)
+
+    def peek(self, offset: int = 0):
+        return self.tokens[min(self.index + offset, len(self.tokens) - 1)]
+
+    def kind(self, offset: int = 0):
+        return self.peek(offset).kind
+
+    def advance(self):
+        token = self.tokens[self.index]
+        if token.kind != 'EOF':
+            self.index += 1
+
+        return token
+
+    def error(self):
+        index, token = self.index, self.peek()
+        for start, error_index, error_token in self.speculation_errors:
+            if start <= self.index < error_index and error_index > index:
+                index, token = error_index, error_token
+
+        raise ParseError(token, index)
+
+    def speculate(self, parse: Callable[[], Any]):
+        """Runs `parse`, if it fails the parser is rewound and None is returned"""
+        start = self.index
+        try:
+            return parse()
+        except ParseError as e:
+            if e.committed:
+                self.speculation_errors.append((start, e.index, e.token))
+
+            self.index = start
+            return None
+
+    def expect(self, kind: str):
+        if self.kind() != kind:
+            self.error()
+
+        return self.advance()
+
+    def program(self):
+        pos = self.pos(self.peek())
+        nodes = []
+        while self.kind() != 'EOF':
+            nodes.append(self.stmt())
+
+        return ir.Program(pos, nodes)
+
+    def stmt(self):
+        match self.kind():
+            case 'MUTABLE':
+                return self.var_assign()
+            case 'ID' if self.kind(1) == 'ASSIGN' or (self.kind(1) in ASSIGN_OPS and self.kind(2) == 'ASSIGN'):
+                return self.var_assign()
+            case 'FUNC':
+                return self.func_assign()
+            case 'WHILE':
+                return self.while_stmt()
+            case 'IF':
+                return self.if_stmt()
+            case 'USE':
+                return self.use_stmt()
+            case 'EXTERN':
+                return self.extern_stmt()
+            case _:
+                return self.expr()
+
+    def body_stmt(self):
+        match self.kind():
+            case 'RETURN':
+                pos = self.pos(self.advance())
+                expr = self.expr()
+                return ir.Return(pos, expr.type, expr)
+            case 'BREAK':
+                return ir.Break(self.pos(self.advance()))
+            case 'CONTINUE':
+                return ir.Continue(self.pos(self.advance()))
+            case _:
+                return self.stmt()
+
+    def body(self):
+        pos = self.pos(self.expect('LBRACE'))
+        nodes = []
+        while self.kind() != 'RBRACE':
+            nodes.append(self.body_stmt())
+
+        self.advance()
+        return ir.Body(pos, ir.Type('any'), nodes)
+
+    def type(self):
+        typ = ir.Type(self.expect('ID').text)
+        while self.kind() == 'AMPERSAND':
+            self.advance()
+            typ = ir.ReferenceType(typ)
+
+        return typ
+
+    def args(self):
+        args = []
+        if self.kind() == 'RPAREN':
+            return args
+
+        args.append(self.arg())
+        while self.kind() == 'COMMA':
+            self.advance()
+            args.append(self.arg())
+
+        return args
+
+    def arg(self):
+        pos = self.pos(self.peek())
+        value = self.expr()
+        return ir.Arg(pos, value.type, value)
+
+    def params(self):
+        params = []
+        if self.kind() == 'RPAREN':
+            return params
+
+        params.append(self.param())
+        while self.kind() == 'COMMA':
+            self.advance()
+            params.append(self.param())
+
+        return params
+
+    def param(self):
+        pos = self.pos(self.peek())
+        is_mutable = self.kind() == 'MUTABLE'
+        if is_mutable:
+            self.advance()
+
+        typ = self.type()
+        return ir.Param(pos, typ, self.expect('ID').text, is_mutable)
+
+    def func_name(self):
+        if self.kind() == 'NEW':
+            self.advance()
+            return 'new', None
+
+        if self.kind(1) not in ('DOT', 'AMPERSAND'):
+            return self.expect('ID').text, None
+
+        extend_type = self.type()
+        self.expect('DOT')
+        if self.kind() == 'NEW':
+            self.advance()
+            return 'new', extend_type
+
+        return self.expect('ID').text, extend_type
+
+    def generic_params(self):
+        generic_params = []
+        if self.kind() != 'LT':
+            return generic_params
+
+        self.advance()
+        generic_params.append(self.expect('ID').text)
+        while self.kind() == 'COMMA':
+            self.advance()
+            generic_params.append(self.expect('ID').text)
+
+        self.expect('GT')
+        return generic_params
+
+    def func_assign(self):
+        pos = self.pos(self.expect('FUNC'))
+        func_name, extend_type = self.func_name()
+        generic_params = self.generic_params()
+        self.expect('LPAREN')
+        params = self.params()
+        self.expect('RPAREN')
+        return_type = ir.Type('nil')
+        if self.kind() == 'RETURNS':
+            self.advance()
+            return_type = self.type()
+
+        return ir.Function(
+            pos, return_type, func_name, params, self.body(),
+            flags=ir.FunctionFlags(),
+            extend_type=extend_type, generic_params=generic_params
         )
-    
-    def visitReturnArrow(self, ctx: GemParser.ReturnArrowContext):
-        return self.visitType(ctx.type_()) if ctx is not None else ir.Type('nil')
-    
-    def visitFuncName(self, ctx: GemParser.FuncNameContext):
-        func_name = ctx.ID().getText() if ctx.ID() is not None else 'new'
-        extend_type = self.visitType(ctx.type_()) if ctx.type_() is not None else None
-        return func_name, extend_type
-    
-    def visitExternStmt(self, ctx: GemParser.ExternStmtContext):
-        pos = self.pos(ctx)
-        name = ctx.ID().getText()
+
+    def var_assign(self):
+        pos = self.pos(self.peek())
+        is_mutable = self.kind() == 'MUTABLE'
+        if is_mutable:
+            self.advance()
+
+        name = self.expect('ID').text
+        op = None
+        if not is_mutable and self.kind() in ASSIGN_OPS:
+            op = self.advance().text
+
+        self.expect('ASSIGN')
+        return ir.Variable(pos, ir.Type('any'), name, self.expr(), is_mutable, op)
+
+    def if_stmt(self):
+        pos = self.pos(self.expect('IF'))
+        cond = self.expr()
+        body = self.body()
+        elseifs = []
+        while self.kind() == 'ELSE' and self.kind(1) == 'IF':
+            elseif_pos = self.pos(self.advance())
+            self.advance()
+            elseif_cond = self.expr()
+            elseifs.append(ir.Elseif(elseif_pos, elseif_cond, self.body()))
+
+        else_body = None
+        if self.kind() == 'ELSE':
+            self.advance()
+            else_body = self.body()
+
+        return ir.If(pos, cond, body, else_body, elseifs)
+
+    def while_stmt(self):
+        pos = self.pos(self.expect('WHILE'))
+        cond = self.expr()
+        return ir.While(pos, cond, self.body())
+
+    def use_stmt(self):
+        pos = self.pos(self.expect('USE'))
+        return ir.Use(pos, self.expect('STRING').text[1:-1])
+
+    def extern_stmt(self):
+        pos = self.pos(self.expect('EXTERN'))
+        name = self.expect('ID').text
         cobjects = CRegistry.get_all_cobjects()
         cobj = cobjects.get(name)
         if cobj is None:
-            pos.comptime_error(self.file, f'unknown c object \'{name}\'')
-        
+            if self.extern_error is None:
+                self.extern_error = (pos, f'unknown c object \'{name}\'')
+
+            return ir.Function(pos, ir.Type('nil'), name, flags=ir.FunctionFlags(extern=True))
+
         ret_type = code_type_to_ir_type(cobj.func_type.return_type, self.file.scope)
         params = [
             ir.Param(pos, code_type_to_ir_type(typ, self.file.scope), f'{i}')
             for i, typ in enumerate(cobj.func_type.args)
         ]
-        
+
         return ir.Function(pos, ret_type, name, params, flags=ir.FunctionFlags(extern=True))
-    
-    def visitGenericParams(self, ctx):
-        return [self.visitGenericParam(param) for param in ctx.genericParam()]
-    
-    def visitGenericParam(self, ctx):
-        return ctx.ID().getText()
-    
-    def visitFuncAssign(self, ctx):
-        return_type = self.visitReturnArrow(ctx.returnArrow())
-        func_name, extend_type = self.visitFuncName(ctx.funcName())
-        generic_params = self.visitGenericParams(ctx.genericParams()) if ctx.genericParams() is not None else []
-        return ir.Function(
-            self.pos(ctx), return_type, func_name,
-            self.visitParams(ctx.params()), self.visitBody(ctx.body()),
-            flags=ir.FunctionFlags(),
-            extend_type=extend_type, generic_params=generic_params
-        )
-    
-    def visitVarAssign(self, ctx):
-        return ir.Variable(
-            self.pos(ctx), ir.Type('any'), ctx.ID().getText(), self.visit(ctx.expr()),
-            ctx.MUTABLE() is not None, ctx.op.text if ctx.op is not None else None
-        )
-    
-    def visitIfStmt(self, ctx):
-        return ir.If(
-            self.pos(ctx), self.visit(ctx.expr()),
-            self.visitBody(ctx.body()), self.visitElseStmt(ctx.elseStmt()),
-            [self.visitElseifStmt(elseif) for elseif in ctx.elseifStmt()]
-        )
-    
-    def visitElseStmt(self, ctx):
-        return self.visitBody(ctx.body()) if ctx is not None else None
-    
-    def visitElseifStmt(self, ctx):
-        return ir.Elseif(self.pos(ctx), self.visit(ctx.expr()), self.visitBody(ctx.body()))
-    
-    def visitWhileStmt(self, ctx):
-        return ir.While(self.pos(ctx), self.visit(ctx.expr()), self.visitBody(ctx.body()))
-    
-    def visitUseStmt(self, ctx):
-        return ir.Use(self.pos(ctx), ctx.STRING().getText()[1:-1])
-    
-    def visitInt(self, ctx):
-        return ir.Int(self.pos(ctx), ir.Type('int'), int(ctx.getText()))
-    
-    def visitFloat(self, ctx):
-        return ir.Float(self.pos(ctx), ir.Type('float'), float(ctx.getText()))
-    
-    def visitString(self, ctx):
-        return ir.String(self.pos(ctx), ir.Type('string'), ctx.getText()[1:-1])
-    
-    def visitBool(self, ctx):
-        return ir.Bool(self.pos(ctx), ir.Type('bool'), ctx.getText() == 'true')
-    
-    def visitId(self, ctx):
-        return ir.Id(self.pos(ctx), ir.Type('any'), ctx.getText())
-    
-    def visitCall(self, ctx):
-        return ir.Call(self.pos(ctx), ir.Type('any'), ctx.ID().getText(), self.visitArgs(ctx.args()))
-    
-    def visitParen(self, ctx):
-        expr = self.visit(ctx.expr())
-        return ir.Bracketed(self.pos(ctx), expr.type, expr)
-    
-    def visitCast(self, ctx):
-        return ir.Cast(self.pos(ctx), self.visitType(ctx.type_()), self.visit(ctx.expr()))
-    
-    def visitAttr(self, ctx):
-        return ir.Attribute(
-            self.pos(ctx), ir.Type('any'), self.visit(ctx.expr()), ctx.ID().getText(),
-            self.visitArgs(ctx.args()) if ctx.LPAREN() is not None else None
-        )
-    
-    def visitTernary(self, ctx):
-        return ir.Ternary(
-            self.pos(ctx), ir.Type('any'), self.visit(ctx.expr(1)),
-            self.visit(ctx.expr(0)), self.visit(ctx.expr(2))
-        )
-    
-    def visitNew(self, ctx):
-        return ir.New(
-            self.pos(ctx), ir.Type('any'), self.visitType(ctx.type_()),
-            self.visitArgs(ctx.args())
-        )
-    
-    def visitOperation(self, ctx):
-        pos = self.pos(ctx)
-        op = ctx.op.text
-        if isinstance(ctx.expr(), list):
-            left, right = self.visit(ctx.expr(0)), self.visit(ctx.expr(1))
-            return ir.Operation(pos, ir.Type('any'), op, left, right)
-        else:
-            left = self.visit(ctx.expr())
-            return ir.UnaryOperation(pos, ir.Type('any'), op, left)
-    
-    def visitAddition(self, ctx):
-        return self.visitOperation(ctx)
-    
-    def visitMultiplication(self, ctx):
-        return self.visitOperation(ctx)
-    
-    def visitRelational(self, ctx):
-        return self.visitOperation(ctx)
-    
-    def visitLogical(self, ctx):
-        return self.visitOperation(ctx)
-    
-    def visitUnary(self, ctx):
-        return self.visitOperation(ctx)
+
+    def expr(self, precedence: int = 0):
+        start = self.peek()
+        left = self.primary()
+        while True:
+            kind = self.kind()
+            if kind == 'IF' and TERNARY_PRECEDENCE >= precedence:
+                ternary = self.ternary(start, left)
+                if ternary is None:
+                    break
+
+                left = ternary
+            elif kind == 'DOT' and ATTR_PRECEDENCE >= precedence:
+                self.advance()
+                name = self.expect('ID').text
+                args = None
+                if self.kind() == 'LPAREN':
+                    args = self.speculate(self.call_args)
+
+                left = ir.Attribute(self.pos(start), ir.Type('any'), left, name, args)
+            elif kind in BINARY_OPS and BINARY_OPS[kind] >= precedence:
+                op = self.advance().text
+                right = self.expr(BINARY_OPS[kind] + 1)
+                left = ir.Operation(self.pos(start), ir.Type('any'), op, left, right)
+            else:
+                break
+
+        return left
+
+    def ternary_cond(self):
+        self.expect('IF')
+        cond = self.expr()
+        if self.kind() != 'ELSE':
+            self.error()
+
+        return cond
+
+    def ternary(self, start: Token, left: ir.Node):
+        """Parses `left if cond else other`, an 'if' that is not followed by a condition and 'else' belongs to an if
+        statement after the expression instead"""
+        cond = self.speculate(self.ternary_cond)
+        if cond is None:
+            return None
+
+        self.advance()
+        other = self.expr(TERNARY_PRECEDENCE + 1)
+        return ir.Ternary(self.pos(start), ir.Type('any'), cond, left, other)
+
+    def call_args(self):
+        """Parses the arguments of a call, the tokens up to the first comma could also be a bracketed expression after an
+        identifier"""
+        self.expect('LPAREN')
+        if self.kind() == 'RPAREN':
+            self.advance()
+            return []
+
+        args = [self.arg()]
+        if self.kind() != 'COMMA':
+            self.expect('RPAREN')
+            return args
+
+        try:
+            while self.kind() == 'COMMA':
+                self.advance()
+                args.append(self.arg())
+
+            self.expect('RPAREN')
+        except ParseError as e:
+            e.committed = True
+            raise
+
+        return args
+
+    def cast(self):
+        pos = self.pos(self.expect('LPAREN'))
+        typ = self.type()
+        self.expect('RPAREN')
+        return ir.Cast(pos, typ, self.expr(CAST_PRECEDENCE))
+
+    def is_cast(self):
+        if self.kind(1) != 'ID':
+            return False
+
+        offset = 2
+        while self.kind(offset) == 'AMPERSAND':
+            offset += 1
+
+        if offset > 2:
+            return True
+
+        # `(name) expr` is ambiguous, like ANTLR the cast wins whenever an expression can follow the parentheses unless
+        # what follows is an assignment
+        if self.kind(offset) != 'RPAREN' or self.kind(offset + 1) not in EXPR_START:
+            return False
+
+        return not (self.kind(offset + 1) == 'ID' and (
+            self.kind(offset + 2) == 'ASSIGN' or (self.kind(offset + 2) in ASSIGN_OPS and self.kind(offset + 3) == 'ASSIGN')
+        ))
+
+    def primary(self):
+        token = self.peek()
+        pos = self.pos(token)
+        match token.kind:
+            case 'LPAREN' if self.is_cast():
+                return self.cast()
+            case 'LPAREN':
+                self.advance()
+                expr = self.expr()
+                self.expect('RPAREN')
+                return ir.Bracketed(pos, expr.type, expr)
+            case 'ID':
+                self.advance()
+                # `name (...)` is an identifier followed by a bracketed expression or cast if it can't be a call
+                if self.kind() == 'LPAREN' and (args := self.speculate(self.call_args)) is not None:
+                    return ir.Call(pos, ir.Type('any'), token.text, args)
+                
+                return ir.Id(pos, ir.Type('any'), token.text)
+            case 'INT':
+                self.advance()
+                return ir.Int(pos, ir.Type('int'), int(token.text))
+            case 'FLOAT':
+                self.advance()
+                return ir.Float(pos, ir.Type('float'), float(token.text))
+            case 'STRING':
+                self.advance()
+                return ir.String(pos, ir.Type('string'), token.text[1:-1])
+            case 'BOOL':
+                self.advance()
+                return ir.Bool(pos, ir.Type('bool'), token.text == 'true')
+            case 'NEW':
+                self.advance()
+                typ = self.type()
+                self.expect('LPAREN')
+                args = self.args()
+                self.expect('RPAREN')
+                return ir.New(pos, ir.Type('any'), typ, args)
+            case 'NOT' | 'SUB' | 'ADD':
+                self.advance()
+                return ir.UnaryOperation(pos, ir.Type('any'), token.text, self.expr(UNARY_PRECEDENCE))
+            case _:
+                self.error()
@@ -0,0 +1,103 @@
+from dataclasses import fields
+from functools import cache
+from io import BytesIO
+import copyreg
+import pickle
+
+from gem import ir
+
+
+GIRB_MAGIC = b'GIRB'
+GIRB_VERSION = 7
+
+# the names other than IR classes a .girb file is made of
+SAFE_GLOBALS = {
+    ('gem.ir_serializer', 'restore_node'), ('gem.ir_serializer', 'restore_position'),
+    ('pathlib', 'Path'), ('pathlib', 'PosixPath'), ('pathlib', 'WindowsPath'),
+    ('builtins', 'set'), ('builtins', 'frozenset'), ('builtins', 'tuple'), ('builtins', 'list'), ('builtins', 'dict'),
+}
+
+
+@cache
+def field_names(cls: type):
+    return tuple(field.name for field in fields(cls))
+
+def restore_node(cls: type, values: tuple):
+    node = cls.__new__(cls)
+    for name, value in zip(field_names(cls), values):
+        object.__setattr__(node, name, value)
+
+    return node
+
+def reduce_node(node: ir.Node | ir.FunctionFlags):
+    cls = type(node)
+    return restore_node, (cls, tuple(getattr(node, name) for name in field_names(cls)))
+
+def reduce_type(typ: ir.Type):
+    # created again through the constructor so that loaded types are interned like parsed ones
+    return type(typ), (typ.type,)
+
+def restore_position(packed: int):
+    return int.__new__(ir.Position, packed)
+
+def reduce_position(pos: ir.Position):
+    return restore_position, (int(pos),)
+
+def node_classes():
+    classes = [ir.FunctionFlags]
+    pending = [ir.Node]
+    while pending:
+        cls = pending.pop()
+        classes.append(cls)
+        pending.extend(cls.__subclasses__())
+
+    return classes
+
+@cache
+def dispatch_table():
+    table = copyreg.dispatch_table.copy()
+    for cls in node_classes():
+        table[cls] = reduce_type if issubclass(cls, ir.Type) else reduce_node
+
+    table[ir.Position] = reduce_position
+    return table
+
+def dump_ir(obj) -> bytes:
+    """Serializes IR to the binary .girb format. Nodes are written as their class and a tuple of their field values and
+    positions as a single int, nodes that are referenced more than once (e.g. by the program and a symbol table) are only
+    written once. Anything else that can be pickled, like scopes, can be part of the serialized object."""
+    buffer = BytesIO()
+    buffer.write(GIRB_MAGIC)
+    buffer.write(bytes([GIRB_VERSION]))
+    pickler = pickle.Pickler(buffer, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = dispatch_table()
+    pickler.dump(obj)
+    return buffer.getvalue()
+
+class IRUnpickler(pickle.Unpickler):
+    """Only loads the classes of gem.ir, the names in SAFE_GLOBALS and the given classes. The build cache can be shared
+    between machines, a .girb file written to it must not be able to call anything else in every build that reads it."""
+
+    def __init__(self, file: BytesIO, classes: tuple[type, ...]):
+        super().__init__(file)
+        self.classes = {(cls.__module__, cls.__qualname__): cls for cls in classes}
+
+    def find_class(self, module: str, name: str):
+        if (cls := self.classes.get((module, name))) is not None:
+            return cls
+
+        if module == 'gem.ir':
+            value = getattr(ir, name, None)
+            if isinstance(value, type) and value.__module__ == 'gem.ir':
+                return value
+        elif (module, name) in SAFE_GLOBALS:
+            return super().find_class(module, name)
+
+        raise pickle.UnpicklingError(f'\'{module}.{name}\' is not allowed in a .girb file')
+
+def load_ir(data: bytes, classes: tuple[type, ...] = ()):
+    """Deserializes IR written by `dump_ir`, `classes` are the classes other than the ones of IR it may contain"""
+    if data[:len(GIRB_MAGIC)] != GIRB_MAGIC or data[len(GIRB_MAGIC)] != GIRB_VERSION:
+        raise ValueError('not a .girb file of this compiler version')
+
+    return IRUnpickler(BytesIO(memoryview(data)[len(GIRB_MAGIC) + 1:]), classes).load()
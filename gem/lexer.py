@@ -0,0 +1,61 @@
+from dataclasses import dataclass
+from bisect import bisect_right
+import re
+
+
+# alternatives are ordered so that the first one that matches is also the longest match, which is how the lexer rules of
+# Gem.g4 are chosen. Keywords and bools are lexed as IDs and looked up in KEYWORDS afterwards.
+TOKEN_REGEX = re.compile(r'''
+    (?P<WHITESPACE>[\t\r\n ]+)
+    | (?P<COMMENT>//[^\n]*\n)
+    | (?P<MULTILINE_COMMENT>/\*.*?\*/)
+    | (?P<FLOAT>-?[0-9]*\.[0-9]+)
+    | (?P<INT>-?[0-9]+)
+    | (?P<STRING>"[^"]*"|'[^']*')
+    | (?P<ID>[a-zA-Z_][a-zA-Z_0-9]*)
+    | (?P<EEQ>==) | (?P<NEQ>!=) | (?P<GTE>>=) | (?P<LTE><=) | (?P<AND>&&) | (?P<OR>\|\|) | (?P<RETURNS>->)
+    | (?P<ADD>\+) | (?P<SUB>-) | (?P<MUL>\*) | (?P<DIV>/) | (?P<MOD>%) | (?P<GT>>) | (?P<LT><) | (?P<NOT>!)
+    | (?P<DOT>\.) | (?P<COMMA>,) | (?P<ASSIGN>=) | (?P<LPAREN>\() | (?P<RPAREN>\)) | (?P<LBRACE>\{) | (?P<RBRACE>\})
+    | (?P<AMPERSAND>&) | (?P<APOSTROPHE>')
+    | (?P<OTHER>.)
+''', re.VERBOSE | re.DOTALL)
+
+SKIPPED_TOKENS = {'WHITESPACE', 'COMMENT', 'MULTILINE_COMMENT'}
+
+KEYWORDS = {
+    'if': 'IF', 'use': 'USE', 'new': 'NEW', 'fn': 'FUNC', 'else': 'ELSE', 'mut': 'MUTABLE', 'return': 'RETURN',
+    'extern': 'EXTERN', 'while': 'WHILE', 'break': 'BREAK', 'continue': 'CONTINUE', 'true': 'BOOL', 'false': 'BOOL'
+}
+
+
+@dataclass(slots=True)
+class Token:
+    kind: str
+    text: str
+    line: int
+    column: int
+
+
+def tokenize(src: str) -> list[Token]:
+    """Splits Gem source code into tokens the same way the lexer generated from Gem.g4 does, the last token is always
+    EOF. Lines start at 1 and columns at 0."""
+    line_starts = [0]
+    line_starts.extend(match.end() for match in re.finditer('\n', src))
+
+    tokens = []
+    for match in TOKEN_REGEX.finditer(src):
+        kind = match.lastgroup
+        if kind in SKIPPED_TOKENS:
+            continue
+
+        text = match.group()
+        if kind == 'ID':
+            kind = KEYWORDS.get(text, 'ID')
+
+        start = match.start()
+        line = bisect_right(line_starts, start)
+        tokens.append(Token(kind, text, line, start - line_starts[line - 1]))
+
+    line = len(line_starts)
+    tokens.append(Token('EOF', '<EOF>', line, len(src) - line_starts[line - 1]))
+    return tokens
@@ -0,0 +1,177 @@
+from ctypes import CFUNCTYPE, c_int
+from tempfile import TemporaryFile
+from functools import cache
+from os import dup, dup2, close
+from logging import info
+from pathlib import Path
+from sys import platform, stderr
+
+from llvmlite import binding as llvm
+
+from gem import ir
+
+
+BACKENDS = ('llvmlite', 'clang')
+OPT_LEVELS = ('0', '1', '2', '3', 's')
+
+
+@cache
+def init_llvm():
+    llvm.initialize_native_target()
+    llvm.initialize_native_asmprinter()
+    info('Initialized native LLVM target')
+
+def speed_level(options: ir.CompileOptions):
+    return 2 if options.opt_level == 's' else int(options.opt_level)
+
+@cache
+def host_cpu():
+    init_llvm()
+    return llvm.get_host_cpu_name(), llvm.get_host_cpu_features().flatten()
+
+def target_cpu(options: ir.CompileOptions):
+    """The CPU name and LLVM feature string code is generated for. `native` is the CPU the compiler runs on with all of
+    its features, `--target-features` are added after the features of the CPU so they can also turn them off."""
+    if options.target_cpu == 'native':
+        cpu, features = host_cpu()
+    else:
+        cpu, features = options.target_cpu, ''
+
+    if options.target_features:
+        features = f'{features},{options.target_features}' if features else options.target_features
+
+    return cpu, features
+
+@cache
+def target_errors(cpu: str, features: str):
+    """The CPUs and features LLVM does not know for the target, as the warnings it prints when a target machine is
+    created for them. LLVM ignores them and goes on, code generated without the CPU can end the process with a fatal
+    error later."""
+    init_llvm()
+    stderr.flush()
+    with TemporaryFile() as output:
+        saved_stderr = dup(2)
+        dup2(output.fileno(), 2)
+        try:
+            llvm.Target.from_default_triple().create_target_machine(cpu, features)
+        finally:
+            dup2(saved_stderr, 2)
+            close(saved_stderr)
+
+        output.seek(0)
+        warnings = output.read().decode('utf-8', 'replace').splitlines()
+
+    # every warning is printed once for each subtarget LLVM creates
+    return list(dict.fromkeys(warning.split(' (ignoring')[0] for warning in warnings if 'not a recognized' in warning))
+
+def create_target_machine(options: ir.CompileOptions, jit: bool = False):
+    init_llvm()
+    target = llvm.Target.from_default_triple()
+    opt = speed_level(options)
+    cpu, features = target_cpu(options)
+    if jit:
+        return target.create_target_machine(cpu, features, opt, codemodel='jitdefault', jit=True)
+
+    reloc = 'default' if platform == 'win32' else 'pic'
+    return target.create_target_machine(cpu, features, opt, reloc, codemodel='default')
+
+@cache
+def target_data_layout(cpu: str, features: str):
+    init_llvm()
+    return str(llvm.Target.from_default_triple().create_target_machine(cpu, features).target_data)
+
+def data_layout(options: ir.CompileOptions):
+    """The data layout of the target, which tells the optimizer the size and alignment of types. It only depends on the
+    CPU so the target machine it is read from is created once for each, not for every module."""
+    return target_data_layout(*target_cpu(options))
+
+def parse_module(code: str, target_machine: llvm.TargetMachine, context: llvm.ContextRef):
+    """Parses and verifies textual LLVM IR into an in-memory module for the target machine"""
+    module = llvm.parse_assembly(code, context)
+    module.triple = target_machine.triple
+    module.data_layout = str(target_machine.target_data)
+    module.verify()
+    return module
+
+def optimize_module(module: llvm.ModuleRef, target_machine: llvm.TargetMachine, options: ir.CompileOptions):
+    """Runs LLVM's default module pipeline for the -O level, which also inlines the functions of the module into each
+    other before the object file is emitted"""
+    if options.opt_level == '0':
+        promote_allocas(module, target_machine)
+        return
+
+    pto = llvm.create_pipeline_tuning_options(speed_level=speed_level(options))
+    # vectorized like clang does, from -O2 and for -Os
+    vectorizing = options.opt_level in ('2', '3', 's')
+    pto.loop_vectorization = vectorizing and options.vectorize
+    pto.slp_vectorization = vectorizing and options.slp_vectorize
+    if options.opt_level == 's':
+        # the pass builder of llvmlite has no size level, -Os is -O2 that inlines only as much as LLVM's -Os threshold
+        # allows and does not unroll loops
+        pto.inlining_threshold = 50
+        pto.loop_unrolling = False
+
+    pass_builder = llvm.create_pass_builder(target_machine, pto)
+    pass_builder.getModulePassManager().run(module, pass_builder)
+
+def promote_allocas(module: llvm.ModuleRef, target_machine: llvm.TargetMachine):
+    """Promotes the stack slots of variables to registers (SROA, which includes mem2reg) which is run even at -O0,
+    codegen stores every variable and parameter on the stack and loads it at every use"""
+    pass_builder = llvm.create_pass_builder(target_machine, llvm.create_pipeline_tuning_options(speed_level=0))
+    pass_manager = llvm.create_new_module_pass_manager()
+    pass_manager.add_sroa_pass()
+    pass_manager.run(module, pass_builder)
+
+def link_libraries(module: llvm.ModuleRef, libraries: list[bytes], context: llvm.ContextRef):
+    """Links the bitcode of used libraries into the module before it is optimized. The functions they define become
+    available_externally, the optimizer can inline them but they are still defined by the libraries' object files."""
+    for bitcode in libraries:
+        library = llvm.parse_bitcode(bitcode, context)
+        for func in library.functions:
+            if not func.is_declaration and func.linkage == llvm.Linkage.external:
+                func.linkage = 'available_externally'
+
+        module.link_in(library)
+
+def emit_object(code: str, options: ir.CompileOptions, libraries: list[bytes], bitcode_file: Path | None = None):
+    """Compiles textual LLVM IR to the bytes of a native object file without spawning a compiler process. The bitcode
+    of the optimized module is written to bitcode_file if one is given."""
+    # modules may be emitted from several build threads at once and an LLVM context must never be shared between threads
+    context = llvm.create_context()
+    target_machine = create_target_machine(options)
+    module = parse_module(code, target_machine, context)
+    link_libraries(module, libraries, context)
+    optimize_module(module, target_machine, options)
+    if bitcode_file is not None:
+        bitcode_file.write_bytes(module.as_bitcode())
+
+    return target_machine.emit_object(module)
+
+def create_jit(code: str, object_files: list[Path], options: ir.CompileOptions, libraries: list[bytes]):
+    """JIT-compiles textual LLVM IR in memory together with already built object files. C library symbols are resolved
+    from the host process."""
+    context = llvm.create_context()
+    target_machine = create_target_machine(options, jit=True)
+    module = parse_module(code, target_machine, context)
+    link_libraries(module, libraries, context)
+    optimize_module(module, target_machine, options)
+
+    engine = llvm.create_mcjit_compiler(module, target_machine)
+    for obj_file in object_files:
+        engine.add_object_file(str(obj_file))
+
+    engine.finalize_object()
+    return engine
+
+def call_main(engine: llvm.ExecutionEngine):
+    """Calls the main function of a JIT-compiled program, returning main's exit code or None if there is no main"""
+    engine.run_static_constructors()
+
+    main_address = engine.get_function_address('main')
+    if main_address == 0:
+        return None
+
+    info('Calling JIT-compiled main')
+    exit_code = CFUNCTYPE(c_int)(main_address)()
+    engine.run_static_destructors()
+    return exit_code
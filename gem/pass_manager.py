@@ -0,0 +1,63 @@
+from logging import info
+
+from gem.sharding import run_passes_sharded, shard_count, shardable_functions
+from gem.passes import CompilerPass
+from gem import ir
+
+
+class PassManager:
+    """Runs the compiler passes over a program in order. Consecutive passes that are `fusable` are run together in a
+    single walk over the top-level statements, each statement goes through all of them before the next one is visited,
+    unless a pass `requires` a pass of that group to have finished the whole program first."""
+
+    def __init__(self, passes: list[type[CompilerPass]]):
+        for i, cls in enumerate(passes):
+            for required in cls.requires:
+                if required not in passes[:i]:
+                    raise ValueError(f'{cls.__name__} requires {required.__name__} to run before it')
+
+        self.passes = passes
+
+    def schedule(self, fuse: bool = True) -> list[list[type[CompilerPass]]]:
+        """Groups the passes into the walks that run them, without fusing every pass is a walk of its own"""
+        groups: list[list[type[CompilerPass]]] = []
+        for cls in self.passes:
+            group = groups[-1] if len(groups) > 0 else None
+            if fuse and group is not None and cls.fusable and all(other.fusable for other in group)\
+                    and not any(required in group for required in cls.requires):
+                group.append(cls)
+            else:
+                groups.append([cls])
+
+        return groups
+
+    def run_group(self, file: ir.File, program: ir.Program, group: list[type[CompilerPass]]) -> ir.Program:
+        if len(group) == 1:
+            return group[0].run(file, program)
+
+        info(f'Running fused passes {", ".join(cls.__name__ for cls in group)} on file {file.path.as_posix()}')
+        passes = [cls(file) for cls in group]
+
+        # with --shard-functions the functions go through the passes in worker processes once everything else has
+        functions = shardable_functions(program)
+        if shard_count(file, len(functions)) == 0:
+            functions = []
+
+        sharded = set(functions)
+        nodes = list(program.nodes)
+        for i, stmt in enumerate(program.nodes):
+            if i not in sharded:
+                nodes[i] = self.run_statement(passes, stmt)
+
+        if len(functions) > 0:
+            results = run_passes_sharded(file, program, group, functions)
+            for i in functions:
+                nodes[i] = results[i] if results is not None else self.run_statement(passes, program.nodes[i])
+
+        return program.replace(nodes=nodes)
+
+    def run_statement(self, passes: list[CompilerPass], stmt: ir.Node):
+        for compiler_pass in passes:
+            stmt = compiler_pass.visit(stmt)
+
+        return stmt
@@ -1,15 +1,39 @@
+from typing import Any, Callable, TypeVar
 from contextlib import contextmanager
-from typing import Any, TypeVar
-from dataclasses import fields
 from logging import info
 from abc import ABC
 
-from gem.ir import File, Node, Program, Scope
+from gem.ir import File, Node, Program, Scope, init_field_names, unchanged
 
 
 NodeType = TypeVar('NodeType', bound=Node)
 
+def visit_value(_, value: Any):
+    return value
+
 class CompilerPass(ABC):
+    # passes that have to finish the whole program before this pass starts
+    requires: tuple[type['CompilerPass'], ...] = ()
+    # whether the pass can be run one top-level statement at a time together with the passes before it, which means
+    # visiting the program does nothing but visit each of its statements in order
+    fusable = False
+    
+    # node class -> the function visiting it, filled in the first time a pass class visits a node class
+    visitors: dict[type, Callable[['CompilerPass', Any], Any]] = {}
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.visitors = {}
+    
+    @classmethod
+    def find_visitor(cls, node_class: type):
+        visitor = getattr(cls, f'visit_{node_class.__name__}', None)
+        if visitor is None:
+            visitor = cls.visit_children if issubclass(node_class, Node) else visit_value
+        
+        cls.visitors[node_class] = visitor
+        return visitor
+    
     def __init__(self, file: File):
         self.file = file
     
@@ -18,6 +42,7 @@ class CompilerPass(ABC):
         old_scope = self.scope
         self.scope = self.scope.make_child()
         yield
+        self.scope.close()
         self.scope = old_scope
     
     @property
@@ -34,27 +59,26 @@ class CompilerPass(ABC):
         return self.visit(program)
     
     def visit(self, node: NodeType) -> NodeType | Any:
-        method_name = f'visit_{type(node).__name__}'
-        if hasattr(self, method_name):
-            method = getattr(self, method_name)
-            return method(node)
-        elif isinstance(node, Node):
-            return self.visit_children(node)
-        else:
-            return node
+        visitor = self.visitors.get(type(node))
+        if visitor is None:
+            visitor = self.find_visitor(type(node))
+        
+        return visitor(self, node)
     
     def visit_children(self, node: NodeType) -> NodeType | Any:
-        node_fields = {}
-        for field in fields(node):
-            if not field.init:
-                continue
-            
-            value = getattr(node, field.name)
+        """Visits the children of a node, the node itself is returned when none of them were changed"""
+        values = []
+        changed = False
+        for name in init_field_names(type(node)):
+            value = getattr(node, name)
             if isinstance(value, Node):
-                node_fields[field.name] = self.visit(value)
+                new_value = self.visit(value)
             elif isinstance(value, list):
-                node_fields[field.name] = [self.visit(element) for element in value]
+                new_value = [self.visit(element) for element in value]
             else:
-                node_fields[field.name] = value
+                new_value = value
+            
+            changed = changed or not unchanged(value, new_value)
+            values.append(new_value)
         
-        return node.__class__(**node_fields)
+        return node.__class__(*values) if changed else node
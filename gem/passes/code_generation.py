@@ -1,4 +1,4 @@
-from typing import Any, cast, override
+from typing import cast, override
 from contextlib import contextmanager
 from importlib import import_module
 from pathlib import Path
@@ -6,13 +6,13 @@ from logging import info
 
 from llvmlite import ir as lir, binding as llvm
 
+from gem.llvm_backend import data_layout
+from gem.scheduler import BuildScheduler
+from gem.intrinsics import INTRINSICS
 from gem.c_registry import CRegistry
 from gem.passes import CompilerPass
 from gem import ir
-from gem.codegen_utils import (
-    NULL, NULL_BYTE, create_static_buffer, create_struct_value, define_identified_type, create_string_constant,
-    get_allocated_struct_field_value, llint, get_struct_field, zero
-)
+from gem.codegen_utils import add_function_attributes, define_identified_type, create_string_constant
 
 
 def code_type_to_ir_type(type: lir.Type, scope: ir.Scope):
@@ -39,11 +39,18 @@ def code_type_to_ir_type(type: lir.Type, scope: ir.Scope):
     raise NotImplementedError(type)
 
 class CodeGenerationPass(CompilerPass):
-    def __init__(self, file: ir.File):
+    def __init__(self, file: ir.File, bodies: frozenset[str] | None = None, build_libraries: bool = True):
         super().__init__(file)
         
+        # names of the functions whose bodies are generated, the others are only declared (None generates all of them)
+        self.bodies = bodies
+        # whether used gem libraries are compiled to object files, processes that generate a shard of a file leave it to
+        # the one that links them
+        self.build_libraries = build_libraries
+        
         self.module = lir.Module(file.path.stem, lir.Context())
         self.module.triple = llvm.get_default_triple()
+        self.module.data_layout = data_layout(file.options)
         
         self.c_registry = CRegistry(self.module, self.file)
         
@@ -59,6 +66,7 @@ class CodeGenerationPass(CompilerPass):
         
         self.while_merge_block = None
         self.while_test_block = None
+        self.alloca_builder: lir.IRBuilder | None = None
     
     @contextmanager
     @override
@@ -118,9 +126,15 @@ class CodeGenerationPass(CompilerPass):
             for overload in node.overloads:
                 self.visit(overload)
             
+            for instance in node.instances:
+                self.visit(instance)
+            
             self.scope.symbol_table.add(ir.Symbol(node.name, self.scope.type_map.get('function'), node, self.file))
             return node
         
+        if self.bodies is not None and node.name not in self.bodies:
+            node = node.replace(body=None)
+        
         ret_type = self.visit(node.ret_type)
         func_type = lir.FunctionType(ret_type, [self.visit(param) for param in node.params])
         func = lir.Function(self.module, func_type, node.name)
@@ -136,16 +150,26 @@ class CodeGenerationPass(CompilerPass):
                 func.name = cobj.llvm_name
             
             func.linkage = 'external'
+            add_function_attributes(func, cobj.attributes)
+        else:
+            # gem has no exceptions, nothing it calls unwinds
+            add_function_attributes(func, ['nounwind', *map(str, node.flags.attributes)])
         
         self.scope.symbol_table.add(ir.Symbol(node.name, self.scope.type_map.get('function'), func, self.file))
         for overload in node.overloads:
             self.visit(overload)
         
         if node.body is not None:
-            builder = lir.IRBuilder(func.append_basic_block('entry'))
+            # the entry block only allocates the stack slots of the function and jumps to its body, so every slot is
+            # allocated once per call even when its variable is declared in a loop, and SROA can promote all of them
+            entry = func.append_basic_block('entry')
+            builder = lir.IRBuilder(func.append_basic_block('body'))
+            old_alloca_builder = self.alloca_builder
+            self.alloca_builder = lir.IRBuilder(entry)
+            self.alloca_builder.position_before(self.alloca_builder.branch(builder.block))
             with self.child_scope(builder):
                 for i, param in enumerate(node.params):
-                    ptr = self.builder.alloca(self.visit(param.type), name=f'{param.name}_ptr')
+                    ptr = self.alloca(self.visit(param.type), f'{param.name}_ptr')
                     self.builder.store(func.args[i], ptr)
                     
                     self.scope.symbol_table.add(ir.Symbol(param.name, param.type, ptr, self.file, is_mutable=param.is_mutable))
@@ -154,12 +178,18 @@ class CodeGenerationPass(CompilerPass):
                 
                 if ret_type == lir.VoidType() and not cast(lir.Block, self.builder.block).is_terminated:
                     self.builder.ret_void()
+            
+            self.alloca_builder = old_alloca_builder
         
         return func
     
+    def alloca(self, typ: lir.Type, name: str = ''):
+        """Allocates a stack slot in the entry block of the function being generated"""
+        return cast(lir.IRBuilder, self.alloca_builder).alloca(typ, name=name)
+    
     def visit_Variable(self, node: ir.Variable):
         value = self.visit(node.value)
-        ptr = self.builder.alloca(value.type, name=f'{node.name}_ptr')
+        ptr = self.alloca(value.type, f'{node.name}_ptr')
         self.builder.store(value, ptr)
         self.scope.symbol_table.add(ir.Symbol(node.name, value.type, ptr, self.file, is_mutable=node.is_mutable))
         return ptr
@@ -281,21 +311,29 @@ class CodeGenerationPass(CompilerPass):
         info(f'Imported python stdlib file {lib_name}')
     
     def use_gem(self, gem_file: Path, lib_name: str):
-        from gem import compile_to_obj
+        from gem import run_compile_passes, compile_to_obj
         
         file = ir.File(gem_file, ir.Scope(), self.file.options)
-        obj_file = compile_to_obj(file)
+        program = run_compile_passes(file)
         
+        self.scope.merge(file.scope)
         for symbol in file.scope.symbol_table.symbols.values():
             func = symbol.value
-            if isinstance(func, lir.Function):
-                new_func = lir.Function(self.module, func.function_type, func.name)
-                new_func.linkage = 'external'
-            elif isinstance(func, ir.Function) and func.is_generic:
+            if not isinstance(func, ir.Function):
+                continue
+            
+            if func.is_generic:
                 self.visit(func)
+            elif func.body is not None or func.flags.extern:
+                new_func = self.visit_Function(ir.Function(func.pos, func.type, func.name, func.params, flags=func.flags))
+                new_func.linkage = 'external'
         
-        self.file.codegen_data.object_files.append(obj_file)
-        self.scope.merge(file.scope)
+        # the library's object file is built in the background while this module is generated, from the file and IR
+        # resolved above so its passes don't run again. Nothing here reads the library's scope after this.
+        if self.build_libraries:
+            scheduler = BuildScheduler.get(self.file.options.jobs)
+            obj_file = scheduler.submit(('object', gem_file), compile_to_obj, file, True, program)
+            self.file.codegen_data.pending_object_files.append(obj_file)
         
         info(f'Imported gem library {lib_name}')
     
@@ -345,139 +383,10 @@ class CodeGenerationPass(CompilerPass):
     def visit_Ternary(self, node: ir.Ternary):
         return self.builder.select(self.visit(node.cond), self.visit(node.true), self.visit(node.false), 'ternary')
     
-    def handle_intrinsics(self, node: ir.Call, args: list[Any]):
-        match node.callee:
-            case 'panic':
-                exit = self.c_registry.get('exit')
-                puts = self.c_registry.get('puts')
-                
-                self.builder.call(puts, [args[0]])
-                self.builder.call(exit, [llint(1)])
-                return self.builder.unreachable()
-            case '__buffer':
-                const = args[0]
-                if not isinstance(const, lir.Constant):
-                    node.pos.comptime_error(self.file, 'Expected integer constant for __buffer')
-                
-                size = const.constant
-                return create_static_buffer(self.module, lir.IntType(8), size, '__buffer', self.builder)
-            case '__create_string':
-                return create_struct_value(self.builder, self.string_type, args, 'string')
-            case '__format_int':
-                snprintf = self.c_registry.get('snprintf')
-                if 'int_fmt' in self.module.globals:
-                    fmt = self.module.get_global('int_fmt')
-                else:
-                    fmt = create_string_constant(self.module, '%d', 'int_fmt', self.builder)
-                
-                return self.builder.call(snprintf, [args[0], args[1], fmt, args[2]], '__format_int')
-            case '__format_float':
-                snprintf = self.c_registry.get('snprintf')
-                if 'float_fmt' in self.module.globals:
-                    fmt = self.module.get_global('float_fmt')
-                else:
-                    fmt = create_string_constant(self.module, '%f', 'float_fmt', self.builder)
-                
-                return self.builder.call(snprintf, [args[0], args[1], fmt, args[2]], '__format_float')
-            case 'string.ptr':
-                string = args[0]
-                if isinstance(getattr(string, 'type'), lir.PointerType):
-                    return get_allocated_struct_field_value(self.builder, string, 0, 'string.ptr')
-                
-                return get_struct_field(self.builder, string, 0, 'string.ptr')
-            case '__null_terminate':
-                ptr, position = args
-                last_char_ptr = self.builder.gep(ptr, [position], True, 'last_char_ptr')
-                return self.builder.store(NULL_BYTE(), last_char_ptr)
-            case '__stdin':
-                acrt_iob_func = self.c_registry.get('__acrt_iob_func')
-                return self.builder.call(acrt_iob_func, [llint(0)], '__stdin')
-            case '__print_pointer_no_newline':
-                printf = self.c_registry.get('printf')
-                
-                string_fmt_name = 'string_fmt'
-                if string_fmt_name in self.module.globals:
-                    string_fmt = self.module.get_global(string_fmt_name)
-                else:
-                    string_fmt = create_string_constant(self.module, '%s', string_fmt_name)
-                
-                return self.builder.call(printf, [string_fmt, args[0]])
-            case '__is_null':
-                ptr = args[0]
-                return self.builder.icmp_signed('==', ptr, NULL(), '__is_null')
-            case '__oom_msg':
-                out_of_memory_msg_name = '__oom_str'
-                if out_of_memory_msg_name in self.module.globals:
-                    return lir.Constant.gep(self.module.get_global(out_of_memory_msg_name), [zero(32), zero(32)])
-                else:
-                    return create_string_constant(self.module, 'out of memory', out_of_memory_msg_name)
-            case 'string.length':
-                string = args[0]
-                if isinstance(getattr(string, 'type'), lir.PointerType):
-                    return get_allocated_struct_field_value(self.builder, string, 1, 'string.length')
-                
-                return get_struct_field(self.builder, string, 1, 'string.length')
-            case '__null':
-                return NULL()
-            case 'int.+.int':
-                return self.builder.add(args[0], args[1], 'int.+.int')
-            case 'int.-.int':
-                return self.builder.sub(args[0], args[1], 'int.-.int')
-            case 'int.*.int':
-                return self.builder.mul(args[0], args[1], 'int.*.int')
-            case 'int./.int':
-                return self.builder.sdiv(args[0], args[1], 'int./.int')
-            case 'int.%.int':
-                return self.builder.srem(args[0], args[1], 'int.%.int')
-            case 'int.==.int':
-                return self.builder.icmp_signed('==', args[0], args[1], 'int.==.int')
-            case 'int.!=.int':
-                return self.builder.icmp_signed('!=', args[0], args[1], 'int.!=.int')
-            case 'int.>.int':
-                return self.builder.icmp_signed('>', args[0], args[1], 'int.>.int')
-            case 'int.<.int':
-                return self.builder.icmp_signed('<', args[0], args[1], 'int.<.int')
-            case 'int.>=.int':
-                return self.builder.icmp_signed('>=', args[0], args[1], 'int.>=.int')
-            case 'int.<=.int':
-                return self.builder.icmp_signed('<=', args[0], args[1], 'int.<=.int')
-            case 'float.+.float':
-                return self.builder.fadd(args[0], args[1], 'float.+.float')
-            case 'float.-.float':
-                return self.builder.fsub(args[0], args[1], 'float.-.float')
-            case 'float.*.float':
-                return self.builder.fmul(args[0], args[1], 'float.*.float')
-            case 'float./.float':
-                return self.builder.fdiv(args[0], args[1], 'float./.float')
-            case 'float.%.float':
-                return self.builder.frem(args[0], args[1], 'float.%.float')
-            case 'float.==.float':
-                return self.builder.fcmp_ordered('==', args[0], args[1], 'float.==.float')
-            case 'float.!=.float':
-                return self.builder.fcmp_ordered('!=', args[0], args[1], 'float.!=.float')
-            case 'float.>.float':
-                return self.builder.fcmp_ordered('>', args[0], args[1], 'float.>.float')
-            case 'float.<.float':
-                return self.builder.fcmp_ordered('<', args[0], args[1], 'float.<.float')
-            case 'float.>=.float':
-                return self.builder.fcmp_ordered('>=', args[0], args[1], 'float.>=.float')
-            case 'float.<=.float':
-                return self.builder.fcmp_ordered('<=', args[0], args[1], 'float.<=.float')
-            case 'bool.==.bool':
-                return self.builder.icmp_signed('==', args[0], args[1], 'bool.==.bool')
-            case 'bool.!=.bool':
-                return self.builder.icmp_signed('!=', args[0], args[1], 'bool.!=.bool')
-            case 'bool.&&.bool':
-                return self.builder.and_(args[0], args[1], 'bool.&&.bool')
-            case 'bool.||.bool':
-                return self.builder.or_(args[0], args[1], 'bool.||.bool')
-            case '!.bool':
-                return self.builder.not_(args[0], '!.bool')
-    
     def visit_Call(self, node: ir.Call):
         args = [self.visit(arg) for arg in node.args]
-        if (result := self.handle_intrinsics(node, args)) is not None:
-            return result
+        if (intrinsic := INTRINSICS.get(node.callee)) is not None:
+            return intrinsic.emit(self, node, args)
         
         symbol = self.scope.symbol_table.get(node.callee)
         assert symbol is not None
@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from logging import info
 from typing import cast
 
+from gem.passes.name_type_resolver import NameAndTypeResolverPass
 from gem.passes import CompilerPass
 from gem import ir
 
@@ -37,6 +38,9 @@ class MemoryManagerPass(CompilerPass):
     multiple places and passed around in something like structs) then this pass assigns the value to a `Ref` object automatically
     to ensure memory safety."""
     
+    requires = (NameAndTypeResolverPass,)
+    fusable = True
+    
     def __init__(self, file):
         super().__init__(file)
 
@@ -59,7 +63,7 @@ class MemoryManagerPass(CompilerPass):
         return var.to_id(node.pos)
 
     def destroy_owned_value(self, pos: ir.Position, symbol: ir.Symbol):
-        destroy_symbol = self.scope.symbol_table.get(f'{symbol.type}.destroy')
+        destroy_symbol = self.scope.symbol_table.get(ir.member_callee(symbol.type, 'destroy'))
         assert destroy_symbol is not None, f'Could not find destroy method for type {symbol.type}'
 
         destroy_func = destroy_symbol.value
@@ -75,7 +79,7 @@ class MemoryManagerPass(CompilerPass):
     def end_of_scope(self, pos: ir.Position):
         self.scope.body_nodes.append(ir.Comment(pos, 'end of scope'))
         for symbol in self.scope.symbol_table.symbols.values():
-            destroy_method = self.scope.symbol_table.get(f'{symbol.type}.destroy')
+            destroy_method = self.scope.symbol_table.get(ir.member_callee(symbol.type, 'destroy'))
             if destroy_method is None:
                 continue
 
@@ -91,7 +95,7 @@ class MemoryManagerPass(CompilerPass):
         if isinstance(node, DONT_EXTRACT) or not self.can_extract:
             return node
 
-        destroy_method = self.scope.symbol_table.get(f'{node.type}.destroy')
+        destroy_method = self.scope.symbol_table.get(ir.member_callee(node.type, 'destroy'))
         if destroy_method is None:
             return node
         
@@ -101,7 +105,7 @@ class MemoryManagerPass(CompilerPass):
         return self.extract_node(super().visit(node))
 
     def visit_Program(self, node: ir.Program):
-        return ir.Program(node.pos, [self.visit(stmt) for stmt in node.nodes])
+        return node.replace(nodes=[self.visit(stmt) for stmt in node.nodes])
 
     def visit_Body(self, node: ir.Body):
         with self.child_scope():
@@ -121,7 +125,7 @@ class MemoryManagerPass(CompilerPass):
                 
                 self.end_of_scope(pos)
     
-            return ir.Body(node.pos, node.type, self.scope.body_nodes)
+            return node.replace(nodes=self.scope.body_nodes)
 
     def visit_Function(self, node: ir.Function):
         body = node.body
@@ -133,14 +137,13 @@ class MemoryManagerPass(CompilerPass):
                     param.name, param.type, OwnedObject(param, True), self.file, is_mutable=param.is_mutable
                 ))
             
-            body = self.visit_Body(body)
+            with self.file.unique_name_scope(node.name):
+                body = self.visit_Body(body)
             
+            self.scope.close()
             self.scope = old_scope
         
-        return ir.Function(
-            node.pos, node.type, node.name, node.params, body, node.overloads, node.flags, node.extend_type,
-            node.generic_params
-        )
+        return node.replace(body=body)
 
     def visit_Variable(self, node: ir.Variable):
         value = self.visit(node.value)
@@ -153,13 +156,13 @@ class MemoryManagerPass(CompilerPass):
                     node.name, value.type, OwnedObject(value), self.file, is_mutable=node.is_mutable
                 ))
                 
-                return ir.Variable(node.pos, value.type, node.name, value, node.is_mutable, node.op)
+                return node.replace(type=value.type, value=value)
 
         self.scope.symbol_table.add(ir.Symbol(
             node.name, value.type, OwnedObject(value), self.file, is_mutable=node.is_mutable
         ))
         
-        return ir.Variable(node.pos, value.type, node.name, value, node.is_mutable)
+        return node.replace(type=value.type, value=value, op=None)
     
     def visit_Assignment(self, node: ir.Assignment):
         assign_symbol = self.scope.symbol_table.get(node.name)
@@ -175,18 +178,18 @@ class MemoryManagerPass(CompilerPass):
                     node.name, value.type, OwnedObject(value), self.file, is_mutable=assign_symbol.is_mutable
                 ))
                 
-                return ir.Assignment(node.pos, value.type, node.name, value, node.op)
+                return node.replace(type=value.type, value=value)
         
         self.scope.symbol_table.add(ir.Symbol(
             node.name, value.type, OwnedObject(value), self.file, is_mutable=assign_symbol.is_mutable
         ))
         
-        return ir.Assignment(node.pos, value.type, node.name, value, node.op)
+        return node.replace(type=value.type, value=value)
     
     def visit_Elseif(self, node: ir.Elseif):
         cond = self.visit(node.cond)
         body = self.visit_Body(node.body)
-        return ir.Elseif(node.pos, cond, body)
+        return node.replace(cond=cond, body=body)
     
     def visit_If(self, node: ir.If):
         cond = self.visit(node.cond)
@@ -196,12 +199,14 @@ class MemoryManagerPass(CompilerPass):
         if else_body is not None:
             else_body = self.visit_Body(else_body)
         
-        return ir.If(node.pos, cond, body, else_body, [self.visit_Elseif(elseif) for elseif in node.elseifs])
+        return node.replace(
+            cond=cond, body=body, else_body=else_body, elseifs=[self.visit_Elseif(elseif) for elseif in node.elseifs]
+        )
     
     def visit_While(self, node: ir.While):
         cond = self.visit(node.cond)
         body = self.visit_Body(node.body)
-        return ir.While(node.pos, cond, body)
+        return node.replace(cond=cond, body=body)
     
     def visit_Use(self, node: ir.Use):
         stdlib_path = ir.STDLIB_PATH / node.path
@@ -228,11 +233,11 @@ class MemoryManagerPass(CompilerPass):
             if isinstance(symbol.value, OwnedObject):
                 symbol.value.moved = True
         
-        return ir.Return(node.pos, value.type, value)
+        return node.replace(type=value.type, value=value)
     
     def visit_Arg(self, node: ir.Arg):
         value = self.visit(node.value)
-        return ir.Arg(node.pos, value.type, value)
+        return node.replace(type=value.type, value=value)
         
     def visit_Call(self, node: ir.Call):
-        return ir.Call(node.pos, node.type, node.callee, [self.visit_Arg(arg) for arg in node.args])
+        return node.replace(args=[self.visit_Arg(arg) for arg in node.args])
@@ -1,8 +1,10 @@
 from importlib import import_module
+from dataclasses import replace
 from logging import info
 from pathlib import Path
 from typing import cast
 
+from gem.intrinsics import INTRINSICS
 from gem.passes import CompilerPass
 from gem import ir
 
@@ -15,215 +17,23 @@ class NameAndTypeResolverPass(CompilerPass):
     def __init__(self, file: ir.File):
         super().__init__(file)
         
-        self.declare_intrinsic('panic', self.scope.type_map.get('nil'), [
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('pointer'), 'msg')
-        ])
-        
-        self.declare_intrinsic('__buffer', self.scope.type_map.get('pointer'), [
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('int'), 'size')
-        ])
-        
-        self.declare_intrinsic('__create_string', self.scope.type_map.get('string'), [
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('pointer'), 'ptr'),
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('int'), 'length')
-        ])
-        
-        self.declare_intrinsic('__format_int', self.scope.type_map.get('int'), [
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('pointer'), 'buf'),
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('int'), 'length'),
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('int'), 'i')
-        ])
-        
-        self.declare_intrinsic('__format_float', self.scope.type_map.get('int'), [
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('pointer'), 'buf'),
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('int'), 'length'),
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('float'), 'f')
-        ])
-        
-        self.declare_op_intrinsic(
-            '+',
-            self.scope.type_map.get('int'), self.scope.type_map.get('int'), self.scope.type_map.get('int')
-        )
-        
-        self.declare_op_intrinsic(
-            '-',
-            self.scope.type_map.get('int'), self.scope.type_map.get('int'), self.scope.type_map.get('int')
-        )
-        
-        self.declare_op_intrinsic(
-            '*',
-            self.scope.type_map.get('int'), self.scope.type_map.get('int'), self.scope.type_map.get('int')
-        )
-        
-        self.declare_op_intrinsic(
-            '/',
-            self.scope.type_map.get('int'), self.scope.type_map.get('int'), self.scope.type_map.get('int')
-        )
-        
-        self.declare_op_intrinsic(
-            '%',
-            self.scope.type_map.get('int'), self.scope.type_map.get('int'), self.scope.type_map.get('int')
-        )
-        
-        self.declare_op_intrinsic(
-            '==',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('int'), self.scope.type_map.get('int')
-        )
-        
-        self.declare_op_intrinsic(
-            '!=',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('int'), self.scope.type_map.get('int')
-        )
-        
-        self.declare_op_intrinsic(
-            '>',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('int'), self.scope.type_map.get('int')
-        )
-        
-        self.declare_op_intrinsic(
-            '<',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('int'), self.scope.type_map.get('int')
-        )
-        
-        self.declare_op_intrinsic(
-            '>=',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('int'), self.scope.type_map.get('int')
-        )
-        
-        self.declare_op_intrinsic(
-            '<=',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('int'), self.scope.type_map.get('int')
-        )
-        
-        self.declare_op_intrinsic(
-            '+',
-            self.scope.type_map.get('float'), self.scope.type_map.get('float'), self.scope.type_map.get('float')
-        )
-        
-        self.declare_op_intrinsic(
-            '-',
-            self.scope.type_map.get('float'), self.scope.type_map.get('float'), self.scope.type_map.get('float')
-        )
-        
-        self.declare_op_intrinsic(
-            '*',
-            self.scope.type_map.get('float'), self.scope.type_map.get('float'), self.scope.type_map.get('float')
-        )
-        
-        self.declare_op_intrinsic(
-            '/',
-            self.scope.type_map.get('float'), self.scope.type_map.get('float'), self.scope.type_map.get('float')
-        )
-        
-        self.declare_op_intrinsic(
-            '%',
-            self.scope.type_map.get('float'), self.scope.type_map.get('float'), self.scope.type_map.get('float')
-        )
-        
-        self.declare_op_intrinsic(
-            '==',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('float'), self.scope.type_map.get('float')
-        )
-        
-        self.declare_op_intrinsic(
-            '!=',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('float'), self.scope.type_map.get('float')
-        )
+        # (id of a generic function, type arguments) -> the generic function and the function resolved for them, the
+        # generic function is kept so its id can't be reused by another function
+        self.instances: dict[tuple[int, tuple[ir.Type, ...]], tuple[ir.Function, ir.Function]] = {}
+        # id of a function -> its overloads by parameter types
+        self.overload_indices: dict[int, ir.OverloadIndex] = {}
         
-        self.declare_op_intrinsic(
-            '>',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('float'), self.scope.type_map.get('float')
-        )
-        
-        self.declare_op_intrinsic(
-            '<',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('float'), self.scope.type_map.get('float')
-        )
-        
-        self.declare_op_intrinsic(
-            '>=',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('float'), self.scope.type_map.get('float')
-        )
-        
-        self.declare_op_intrinsic(
-            '<=',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('float'), self.scope.type_map.get('float')
-        )
-        
-        self.declare_op_intrinsic(
-            '==',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('bool'), self.scope.type_map.get('bool')
-        )
-        
-        self.declare_op_intrinsic(
-            '!=',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('bool'), self.scope.type_map.get('bool')
-        )
-        
-        self.declare_op_intrinsic(
-            '&&',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('bool'), self.scope.type_map.get('bool')
-        )
-        
-        self.declare_op_intrinsic(
-            '||',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('bool'), self.scope.type_map.get('bool')
-        )
-        
-        self.declare_op_intrinsic(
-            '!',
-            self.scope.type_map.get('bool'), self.scope.type_map.get('bool')
-        )
-        
-        self.declare_intrinsic('string.ptr', self.scope.type_map.get('pointer'), [
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('string'), 'str')
-        ])
-        
-        self.declare_intrinsic('__null_terminate', self.scope.type_map.get('nil'), [
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('pointer'), 'ptr'),
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('int'), 'position')
-        ])
-        
-        self.declare_intrinsic('__stdin', self.scope.type_map.get('FILE'), [])
-        self.declare_intrinsic('__print_pointer_no_newline', self.scope.type_map.get('nil'), [
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('pointer'), 'ptr')
-        ])
-        
-        self.declare_intrinsic('__is_null', self.scope.type_map.get('bool'), [
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('pointer'), 'ptr')
-        ])
-        
-        self.declare_intrinsic('__oom_msg', self.scope.type_map.get('pointer'), [])
-        self.declare_intrinsic('string.length', self.scope.type_map.get('int'), [
-            ir.Param(ir.Position.zero(), self.scope.type_map.get('string'), 's')
-        ])
-        
-        self.declare_intrinsic('__null', self.scope.type_map.get('pointer'), [])
-        
-    def declare_intrinsic(self, name: str, ret_type: ir.Type, params: list[ir.Param]):
-        self.scope.symbol_table.add(ir.Symbol(name, self.scope.type_map.get('function'), ir.Function(
-            ir.Position.zero(), ret_type, name, params
-        ), self.file))
-        
-        info(f'Declared intrinsic {name}')
-    
-    def declare_op_intrinsic(self, op: str, ret_type: ir.Type, a_type: ir.Type, b_type: ir.Type | None = None):
-        if b_type is None:
-            self.declare_intrinsic(f'{op}.{a_type}', ret_type, [
-                ir.Param(ir.Position.zero(), a_type, 'a')
-            ])
-        else:
-            self.declare_intrinsic(f'{a_type}.{op}.{b_type}', ret_type, [
-                ir.Param(ir.Position.zero(), a_type, 'a'),
-                ir.Param(ir.Position.zero(), b_type, 'b')
-            ])
+        for intrinsic in INTRINSICS.values():
+            self.scope.symbol_table.add(ir.Symbol(
+                intrinsic.name, self.scope.type_map.get('function'), intrinsic.declare(), self.file
+            ))
     
     def visit_Program(self, node: ir.Program):
         nodes = []
         for stmt in node.nodes:
             nodes.append(self.visit(stmt))
         
-        return ir.Program(node.pos, nodes)
+        return node.replace(nodes=nodes)
     
     def visit_Type(self, node: ir.Type):
         t = self.scope.type_map.get(node.type)
@@ -237,24 +47,24 @@ class NameAndTypeResolverPass(CompilerPass):
     
     def visit_Arg(self, node: ir.Arg):
         value = self.visit(node.value)
-        return ir.Arg(node.pos, value.type, value)
+        return node.replace(type=value.type, value=value)
     
     def visit_Param(self, node: ir.Param):
-        return ir.Param(node.pos, self.visit(node.type), node.name, node.is_mutable)
+        return node.replace(type=self.visit(node.type))
     
     def visit_Body(self, node: ir.Body):
         nodes = []
         for stmt in node.nodes:
             nodes.append(self.visit(stmt))
         
-        return ir.Body(node.pos, node.type, nodes)
+        return node.replace(nodes=nodes)
     
     def visit_Elseif(self, node: ir.Elseif):
         cond = self.visit(node.cond)
         with self.child_scope():
             body = self.visit(node.body)
         
-        return ir.Elseif(node.pos, cond, body)
+        return node.replace(cond=cond, body=body)
     
     def visit_If(self, node: ir.If):
         cond = self.visit(node.cond)
@@ -266,14 +76,41 @@ class NameAndTypeResolverPass(CompilerPass):
             with self.child_scope():
                 else_body = self.visit(else_body)
         
-        return ir.If(node.pos, cond, body, else_body, [self.visit(elseif) for elseif in node.elseifs])
+        return node.replace(
+            cond=cond, body=body, else_body=else_body, elseifs=[self.visit(elseif) for elseif in node.elseifs]
+        )
     
     def visit_While(self, node: ir.While):
         cond = self.visit(node.cond)
         with self.child_scope():
             body = self.visit(node.body)
         
-        return ir.While(node.pos, cond, body)
+        return node.replace(cond=cond, body=body)
+    
+    def stdlib_attributes(self, func_name: str) -> tuple[ir.FunctionAttribute, ...]:
+        lib_name = self.file.path.stem
+        if self.file.path.resolve() != (ir.STDLIB_PATH / lib_name / f'{lib_name}.gem').resolve():
+            return ()
+        
+        return ir.STDLIB_ATTRIBUTES.get(lib_name, {}).get(func_name, ())
+    
+    def check_attributes(self, node: ir.Function, flags: ir.FunctionFlags, ret_type: ir.Type, params: list[ir.Param]):
+        for attribute in flags.attributes:
+            arg_counts = ir.FUNCTION_ATTRIBUTES.get(attribute.name)
+            if arg_counts is None:
+                node.pos.comptime_error(self.file, f'unknown function attribute \'{attribute.name}\'')
+            
+            if len(attribute.args) not in arg_counts:
+                counts_str = ' or '.join(str(count) for count in arg_counts)
+                node.pos.comptime_error(self.file, f'function attribute \'{attribute.name}\' takes {counts_str} arguments')
+            
+            if attribute.name == 'noalias' and ret_type is not self.scope.type_map.get('pointer'):
+                node.pos.comptime_error(self.file, 'function attribute \'noalias\' requires a pointer return type')
+            
+            # allocsize takes the indices of the parameters the size of the returned memory is computed from
+            for index in attribute.args:
+                if not 0 <= index < len(params) or params[index].type is not self.scope.type_map.get('int'):
+                    node.pos.comptime_error(self.file, f'parameter {index} of \'{attribute.name}\' is not an int parameter')
     
     def visit_Function(self, node: ir.Function, callsite: ir.Call | None = None):
         # if self.scope.parent is not None:
@@ -313,6 +150,11 @@ class NameAndTypeResolverPass(CompilerPass):
         if node.is_generic:
             func_name += '<' + ', '.join(str(type) for type in generic_map.values()) + '>'
         
+        if attributes := self.stdlib_attributes(func_name):
+            flags = replace(flags, attributes=flags.attributes + attributes)
+        
+        self.check_attributes(node, flags, ret_type, params)
+        
         func = ir.Function(node.pos, ret_type, func_name, params, node.body, overloads, flags)
         if is_overload:
             symbol = cast(ir.Symbol, self.scope.symbol_table.get(base_name))
@@ -320,6 +162,10 @@ class NameAndTypeResolverPass(CompilerPass):
             base.overloads.append(func)
         
         self.scope.symbol_table.add(ir.Symbol(func.name, self.scope.type_map.get('function'), func, self.file))
+        if node.is_generic:
+            # registered before the body is resolved so that a recursive call uses this instance
+            node.instances.append(func)
+            self.instances[self.instance_key(node, cast(ir.Call, callsite))] = (node, func)
         
         body = node.body
         if body is not None:
@@ -339,14 +185,14 @@ class NameAndTypeResolverPass(CompilerPass):
             return self.visit(ir.Assignment(node.pos, value.type, node.name, value, node.op))
         
         self.scope.symbol_table.add(ir.Symbol(node.name, value.type, value, self.file, is_mutable=node.is_mutable))
-        return ir.Variable(node.pos, value.type, node.name, value, node.is_mutable)
+        return node.replace(type=value.type, value=value, op=None)
     
     def visit_Assignment(self, node: ir.Assignment):
         symbol = cast(ir.Symbol, self.scope.symbol_table.get(node.name))
         if symbol.is_mutable:
             node.pos.comptime_error(symbol.source, f'\'{node.name}\' is not mutable')
         
-        return ir.Assignment(node.pos, node.type, node.name, node.value)
+        return node.replace(op=None)
     
     def use_gem(self, gem_file: Path, lib_name: str):
         from gem import run_compile_passes
@@ -355,6 +201,7 @@ class NameAndTypeResolverPass(CompilerPass):
         run_compile_passes(file)
         
         self.scope.merge(file.scope)
+        self.scope.dependencies.extend([gem_file, *file.scope.dependencies])
         
         info(f'Imported gem library {lib_name}')
     
@@ -376,19 +223,19 @@ class NameAndTypeResolverPass(CompilerPass):
     
     def visit_Return(self, node: ir.Return):
         value = self.visit(node.value)
-        return ir.Return(node.pos, value.type, value)
+        return node.replace(type=value.type, value=value)
     
     def visit_Int(self, node: ir.Int):
-        return ir.Int(node.pos, self.visit(node.type), node.value)
+        return node.replace(type=self.visit(node.type))
     
     def visit_Float(self, node: ir.Float):
-        return ir.Float(node.pos, self.visit(node.type), node.value)
+        return node.replace(type=self.visit(node.type))
     
     def visit_String(self, node: ir.String):
-        return ir.String(node.pos, self.visit(node.type), node.value)
+        return node.replace(type=self.visit(node.type))
     
     def visit_Bool(self, node: ir.Bool):
-        return ir.Bool(node.pos, self.visit(node.type), node.value)
+        return node.replace(type=self.visit(node.type))
     
     def visit_Id(self, node: ir.Id):
         symbol = self.scope.symbol_table.get(node.name)
@@ -396,11 +243,11 @@ class NameAndTypeResolverPass(CompilerPass):
         if symbol is None and typ is None:
             node.pos.comptime_error(self.file, f'unknown symbol \'{node.name}\'')
         
-        return ir.Id(node.pos, symbol.type if symbol is not None else cast(ir.Type, typ), node.name)
+        return node.replace(type=symbol.type if symbol is not None else cast(ir.Type, typ))
     
     def visit_Bracketed(self, node: ir.Bracketed):
         value = self.visit(node.value)
-        return ir.Bracketed(node.pos, value.type, value)
+        return node.replace(type=value.type, value=value)
     
     def visit_Ternary(self, node: ir.Ternary):
         cond = self.visit(node.cond)
@@ -412,7 +259,7 @@ class NameAndTypeResolverPass(CompilerPass):
         if true.type != false.type:
             node.pos.comptime_error(self.file, 'ternary branches must have the same type')
         
-        return ir.Ternary(node.pos, true.type, cond, true, false)
+        return node.replace(type=true.type, cond=cond, true=true, false=false)
     
     def fix_arg(self, arg: ir.Arg, param: ir.Param):
         if isinstance(param.type, ir.ReferenceType) and not isinstance(arg.type, ir.ReferenceType):
@@ -423,6 +270,26 @@ class NameAndTypeResolverPass(CompilerPass):
         
         return arg
     
+    def overload_index(self, func: ir.Function):
+        index = self.overload_indices.get(id(func))
+        if index is None or not index.is_current(func):
+            index = ir.OverloadIndex(func)
+            self.overload_indices[id(func)] = index
+        
+        return index
+    
+    def instance_key(self, func: ir.Function, callsite: ir.Call):
+        return id(func), tuple(func.create_generic_map(callsite.args).values())
+    
+    def instantiate(self, func: ir.Function, callsite: ir.Call):
+        """Resolves a generic function for the argument types of a call. Every set of type arguments is only resolved
+        once, the instance is added to the instances of the generic function which is where it is generated from."""
+        entry = self.instances.get(self.instance_key(func, callsite))
+        if entry is None:
+            return self.visit_Function(func, callsite)
+        
+        return entry[1]
+    
     def visit_Call(self, node: ir.Call):
         symbol = self.scope.symbol_table.get(node.callee)
         if symbol is None:
@@ -430,45 +297,40 @@ class NameAndTypeResolverPass(CompilerPass):
 
         func = cast(ir.Function, symbol.value)
         args = [self.visit(arg) for arg in node.args]
-        for overload in func.overloads + [func]:
-            info(f'Checking if {overload.name}\'s arguments match')
-            if not overload.match_params(args):
-                continue
-            
-            new_args = [self.fix_arg(arg, param) for arg, param in zip(args, overload.params)]
+        overload = self.overload_index(func).find(args)
+        if overload is None:
+            node.pos.comptime_error(self.file, f'no matching overload for function \'{node.callee}\' with given arguments')
+        
+        new_args = [self.fix_arg(arg, param) for arg, param in zip(args, overload.params)]
+        callsite = overload.call(node.pos, new_args)
+        if overload.is_generic:
+            overload = self.instantiate(overload, callsite)
             callsite = overload.call(node.pos, new_args)
-            if overload.is_generic:
-                overload = self.visit_Function(overload, callsite)
-                self.file.toplevel_scope.body_nodes.append(overload)
-                
-                callsite = overload.call(node.pos, new_args)
-            
-            return callsite
         
-        node.pos.comptime_error(self.file, f'no matching overload for function \'{node.callee}\' with given arguments')
+        return callsite
     
     def visit_Operation(self, node: ir.Operation):
         left = self.visit(node.left)
         right = self.visit(node.right)
         left_type, right_type = left.type, right.type
-        callee = f'{left_type}.{node.op}.{right_type}'
+        callee = ir.operator_callee(node.op, left_type, right_type)
         symbol = self.scope.symbol_table.get(callee)
         if symbol is None:
             node.pos.comptime_error(self.file, f'invalid operation \'{node.op}\' for types \'{left_type}\' and \'{right_type}\'')
         
         func = cast(ir.Function, symbol.value)
-        return ir.Operation(node.pos, func.ret_type, node.op, left, right)
+        return node.replace(type=func.ret_type, left=left, right=right)
     
     def visit_UnaryOperation(self, node: ir.UnaryOperation):
         value = self.visit(node.value)
         value_type = value.type
-        callee = f'{node.op}.{value_type}'
+        callee = ir.operator_callee(node.op, value_type)
         symbol = self.scope.symbol_table.get(callee)
         if symbol is None:
             node.pos.comptime_error(self.file, f'invalid operation \'{node.op}\' on type \'{value_type}\'')
         
         func = cast(ir.Function, symbol.value)
-        return ir.UnaryOperation(node.pos, func.ret_type, node.op, value)
+        return node.replace(type=func.ret_type, value=value)
     
     def visit_Attribute(self, node: ir.Attribute):
         value = self.visit(node.value)
@@ -476,29 +338,29 @@ class NameAndTypeResolverPass(CompilerPass):
         if isinstance(value_type, ir.ReferenceType):
             value_type = value_type.type
         
-        callee = f'{value_type}.{node.attr}'
+        callee = ir.member_callee(value_type, node.attr)
         symbol = self.scope.symbol_table.get(callee)
         if symbol is None:
             node.pos.comptime_error(self.file, f'no attribute \'{node.attr}\' for type \'{value.type}\'')
         
         func = cast(ir.Function, symbol.value)
         args = [self.visit(arg) for arg in node.args] if node.args is not None else None
-        return ir.Attribute(node.pos, func.ret_type, value, node.attr, args)
+        return node.replace(type=func.ret_type, value=value, args=args)
     
     def visit_New(self, node: ir.New):
         new_type = self.visit_Type(node.new_type)
-        callee = f'{new_type}.new'
+        callee = ir.member_callee(new_type, 'new')
         symbol = self.scope.symbol_table.get(callee)
         if symbol is None:
             node.pos.comptime_error(self.file, f'no constructor for type \'{new_type}\'')
         
         func = cast(ir.Function, symbol.value)
         args = [self.visit(arg) for arg in node.args]
-        return ir.New(node.pos, func.ret_type, new_type, args)
+        return node.replace(type=func.ret_type, new_type=new_type, args=args)
     
     def visit_Ref(self, node: ir.Ref):
         symbol = self.scope.symbol_table.get(node.name)
         if symbol is None:
             node.pos.comptime_error(self.file, f'reference to {node.name} no longer exists')
         
-        return ir.Ref(node.pos, self.visit(ir.ReferenceType(symbol.type)), node.name)
+        return node.replace(type=self.visit(ir.ReferenceType(symbol.type)))
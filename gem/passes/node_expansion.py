@@ -1,5 +1,6 @@
 from typing import cast
 
+from gem.passes.name_type_resolver import NameAndTypeResolverPass
 from gem.passes import CompilerPass
 from gem import ir
 
@@ -8,28 +9,36 @@ class NodeExpansionPass(CompilerPass):
     """Gem's attribute gets, sets, method calls, operations, etc are all actually just functions. This pass expands the
     those nodes out into their function calls."""
     
+    requires = (NameAndTypeResolverPass,)
+    fusable = True
+    
     def visit_Program(self, node: ir.Program):
         nodes = []
         for stmt in node.nodes:
             nodes.append(self.visit(stmt))
         
-        return ir.Program(node.pos, nodes)
+        return node.replace(nodes=nodes)
     
     def visit_Body(self, node: ir.Body):
         nodes = []
         for stmt in node.nodes:
             nodes.append(self.visit(stmt))
         
-        return ir.Body(node.pos, node.type, nodes)
+        return node.replace(nodes=nodes)
     
     def visit_Function(self, node: ir.Function):
         overloads = [self.visit(overload) for overload in node.overloads]
-        func = ir.Function(node.pos, node.ret_type, node.name, node.params, node.body, overloads, node.flags)
+        instances = [self.visit(instance) for instance in node.instances]
+        func = ir.Function(
+            node.pos, node.ret_type, node.name, node.params, node.body, overloads, node.flags, node.extend_type,
+            node.generic_params, instances
+        )
         
         self.scope.symbol_table.add(ir.Symbol(func.name, self.scope.type_map.get('function'), func, self.file))
         
+        # the body of a generic function is never resolved, only the bodies of its instances are and those are expanded
         body = node.body
-        if body is not None:
+        if body is not None and not node.is_generic:
             with self.child_scope():
                 for param in node.params:
                     self.scope.symbol_table.add(ir.Symbol(
@@ -46,7 +55,7 @@ class NodeExpansionPass(CompilerPass):
             return self.visit(ir.Assignment(node.pos, value.type, node.name, value, node.op))
         
         self.scope.symbol_table.add(ir.Symbol(node.name, value.type, value, self.file, is_mutable=node.is_mutable))
-        return ir.Variable(node.pos, value.type, node.name, value, node.is_mutable)
+        return node.replace(type=value.type, value=value, op=None)
     
     def visit_Assignment(self, node: ir.Assignment):
         symbol = cast(ir.Symbol, self.scope.symbol_table.get(node.name))
@@ -61,17 +70,17 @@ class NodeExpansionPass(CompilerPass):
             ))
         
         symbol.value = value
-        return ir.Assignment(node.pos, node.type, node.name, value)
+        return node.replace(value=value, op=None)
     
     def visit_Return(self, node: ir.Return):
         value = self.visit(node.value)
-        return ir.Return(node.pos, value.type, value)
+        return node.replace(type=value.type, value=value)
     
     def visit_Int(self, node: ir.Int):
-        return ir.Int(node.pos, self.visit(node.type), node.value)
+        return node.replace(type=self.visit(node.type))
     
     def visit_Float(self, node: ir.Float):
-        return ir.Float(node.pos, self.visit(node.type), node.value)
+        return node.replace(type=self.visit(node.type))
     
     def visit_String(self, node: ir.String):
         return self.visit(ir.Call(node.pos, self.visit(node.type), 'string.new', [
@@ -80,26 +89,26 @@ class NodeExpansionPass(CompilerPass):
         ]))
     
     def visit_StringLiteral(self, node: ir.StringLiteral):
-        return ir.StringLiteral(node.pos, self.scope.type_map.get('pointer'), node.value)
+        return node.replace(type=self.scope.type_map.get('pointer'))
     
     def visit_Bracketed(self, node: ir.Bracketed):
         value = self.visit(node.value)
-        return ir.Bracketed(node.pos, value.type, value)
+        return node.replace(type=value.type, value=value)
     
     def visit_Ternary(self, node: ir.Ternary):
         cond = self.visit(node.cond)
         true = self.visit(node.true)
         false = self.visit(node.false)
-        return ir.Ternary(node.pos, true.type, cond, true, false)
+        return node.replace(type=true.type, cond=cond, true=true, false=false)
     
     def visit_Call(self, node: ir.Call):
-        return ir.Call(node.pos, node.type, node.callee, [self.visit(arg) for arg in node.args])
+        return node.replace(args=[self.visit(arg) for arg in node.args])
     
     def visit_Operation(self, node: ir.Operation):
         left = self.visit(node.left)
         right = self.visit(node.right)
         left_type, right_type = left.type, right.type
-        callee = f'{left_type}.{node.op}.{right_type}'
+        callee = ir.operator_callee(node.op, left_type, right_type)
         if not self.scope.symbol_table.has(callee):
             node.pos.comptime_error(self.file, f'invalid operation \'{node.op}\' for types \'{left_type}\' and \'{right_type}\'')
         
@@ -108,7 +117,7 @@ class NodeExpansionPass(CompilerPass):
     def visit_UnaryOperation(self, node: ir.UnaryOperation):
         value = self.visit(node.value)
         value_type = value.type
-        callee = f'{node.op}.{value_type}'
+        callee = ir.operator_callee(node.op, value_type)
         if not self.scope.symbol_table.has(callee):
             node.pos.comptime_error(self.file, f'invalid operation \'{node.op}\' on type \'{value_type}\'')
         
@@ -120,7 +129,7 @@ class NodeExpansionPass(CompilerPass):
         if isinstance(value_type, ir.ReferenceType):
             value_type = value_type.type
         
-        callee = f'{value_type}.{node.attr}'
+        callee = ir.member_callee(value_type, node.attr)
         args = [value.to_arg()] + (node.args or [])
         symbol = self.scope.symbol_table.get(callee)
         if symbol is None:
@@ -134,7 +143,7 @@ class NodeExpansionPass(CompilerPass):
     
     def visit_New(self, node: ir.New):
         new_type = self.visit(node.new_type)
-        callee = f'{new_type}.new'
+        callee = ir.member_callee(new_type, 'new')
         symbol = self.scope.symbol_table.get(callee)
         if symbol is None:
             node.pos.comptime_error(self.file, f'no constructor for type \'{new_type}\'')
@@ -0,0 +1,97 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+from threading import Lock, local
+from logging import info
+from pathlib import Path
+
+from gem.timing import TIMER
+
+
+class CommandError(Exception):
+    """A build command exited with a non-zero status"""
+
+    def __init__(self, cmd: str, returncode: int):
+        super().__init__(f'command \'{cmd}\' failed with exit code {returncode}')
+        self.cmd = cmd
+        self.returncode = returncode
+
+def run_command(cmd: str, phase: str, path: Path):
+    """Runs a shell command of a build step, raising CommandError if it fails. The command is reported as compiling
+    `path` when timing."""
+    info(f'Executing {phase} command: {cmd}')
+    returncode = TIMER.command(cmd, phase, path)
+    if returncode != 0:
+        raise CommandError(cmd, returncode)
+
+class BuildScheduler:
+    """Runs independent build steps (object files of used libraries, the C runtime) concurrently on a pool of worker
+    threads. Steps that depend on others simply wait on their futures, the link step waits on every object file it needs.
+    Steps submitted from inside a worker run inline so that nested libraries can never deadlock the pool."""
+
+    schedulers: dict[int, 'BuildScheduler'] = {}
+    schedulers_lock = Lock()
+
+    def __init__(self, jobs: int):
+        self.jobs = max(jobs, 1)
+        self.executor = ThreadPoolExecutor(self.jobs, 'gem-build') if self.jobs > 1 else None
+
+        self.steps: dict[Any, Future] = {}
+        self.steps_lock = Lock()
+        self.worker = local()
+
+    @classmethod
+    def get(cls, jobs: int):
+        with cls.schedulers_lock:
+            if jobs not in cls.schedulers:
+                cls.schedulers[jobs] = BuildScheduler(jobs)
+
+            return cls.schedulers[jobs]
+
+    def run_step(self, func: Callable, *args):
+        self.worker.active = True
+        try:
+            return func(*args)
+        finally:
+            self.worker.active = False
+
+    def submit(self, key: Any, func: Callable, *args) -> Future:
+        """Schedules a build step, a step with the same key as an already scheduled step is only run once"""
+        with self.steps_lock:
+            if key in self.steps:
+                return self.steps[key]
+
+            if self.executor is None or getattr(self.worker, 'active', False):
+                future = Future()
+                self.steps[key] = future
+            else:
+                future = self.executor.submit(self.run_step, func, *args)
+                self.steps[key] = future
+                info(f'Scheduled build step {key}')
+                return future
+
+        try:
+            future.set_result(func(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+        return future
+
+    def finish(self):
+        """Waits for every scheduled step and forgets them so the next build starts from scratch"""
+        with self.steps_lock:
+            steps = list(self.steps.values())
+            self.steps.clear()
+
+        for step in steps:
+            step.result()
+
+    def run_commands(self, phase: str, commands: list[tuple[Path, str]]):
+        """Runs shell commands concurrently, at most one per job at a time, and raises the CommandError of the first one
+        that failed after all of them finished. Each command is paired with the source file it compiles which is what it
+        is reported as when timing."""
+        # a pool of its own, the commands are often run by a build step that holds a thread of the scheduler's pool
+        with ThreadPoolExecutor(self.jobs, 'gem-command') as executor:
+            futures = [executor.submit(run_command, cmd, phase, path) for path, cmd in commands]
+
+        for future in futures:
+            future.result()
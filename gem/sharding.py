@@ -0,0 +1,163 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing import get_context
+from dataclasses import replace
+from pickle import PicklingError
+from threading import Lock
+from logging import info
+
+from llvmlite import binding as llvm
+
+from gem.ir_serializer import dump_ir, load_ir
+from gem import ir
+
+
+# files with fewer functions than this are compiled in one process, starting the workers would cost more than it saves
+MIN_SHARDED_FUNCTIONS = 64
+
+executors: dict[int, Executor] = {}
+executors_lock = Lock()
+
+
+def get_executor(jobs: int) -> Executor:
+    """The process pool used to compile functions with `--shard-functions`, started on first use and kept for the rest
+    of the run. Workers are spawned rather than forked so that they never inherit a lock held by another thread."""
+    with executors_lock:
+        if jobs not in executors:
+            executors[jobs] = ProcessPoolExecutor(jobs, mp_context=get_context('spawn'))
+
+        return executors[jobs]
+
+def shard_count(file: ir.File, functions: int):
+    if not file.options.shard_functions or file.options.jobs < 2 or functions < MIN_SHARDED_FUNCTIONS:
+        return 0
+
+    return min(file.options.jobs, functions)
+
+def shardable_functions(program: ir.Program):
+    """Indices of the top-level statements that are functions with a body, the only statements that can be compiled
+    apart from the rest of the program"""
+    return [
+        i for i, stmt in enumerate(program.nodes)
+        if isinstance(stmt, ir.Function) and stmt.body is not None
+    ]
+
+def function_names(func: ir.Function):
+    yield func.name
+    for overload in func.overloads + func.instances:
+        yield from function_names(overload)
+
+def split(items: list, shards: int):
+    # round robin so that the shards stay about as large as each other when function sizes grow through the file
+    return [items[i::shards] for i in range(shards)]
+
+def worker_options(options: ir.CompileOptions):
+    # libraries used by a shard are compiled by the worker itself, they must not start another pool
+    return replace(options, shard_functions=False)
+
+def run_passes_shard(data: bytes, statements_data: bytes) -> bytes:
+    from gem import PASSES
+
+    path, options, scope, group = load_ir(data, tuple(PASSES))
+    statements: list[tuple[int, ir.Node]] = load_ir(statements_data)
+    file = ir.File(path, scope, worker_options(options))
+    passes = [cls(file) for cls in group]
+
+    # the only state a function leaves behind for the statements after it are the symbols it changes in the file's
+    # global scope, these are sent back with the function so the main process can apply them in order
+    symbols = scope.symbol_table.symbols
+    results = []
+    for i, stmt in statements:
+        before = dict(symbols)
+        for compiler_pass in passes:
+            stmt = compiler_pass.visit(stmt)
+
+        changed = [
+            (name, symbol.type, symbol.value, symbol.is_mutable)
+            for name, symbol in symbols.items() if before.get(name) is not symbol
+        ]
+        removed = [name for name in before if name not in symbols]
+        results.append((i, stmt, changed, removed))
+
+    return dump_ir(results)
+
+def run_passes_sharded(file: ir.File, program: ir.Program, group: list, indices: list[int]):
+    """Runs a group of fused passes over the functions at `indices` in worker processes, returns the functions after the
+    passes by index or None when the file could not be sent to the workers"""
+    shards = split(indices, shard_count(file, len(indices)))
+    try:
+        data = dump_ir((file.path, file.options, file.scope, group))
+        shard_data = [dump_ir([(i, program.nodes[i]) for i in shard]) for shard in shards]
+    except (PicklingError, AttributeError, TypeError) as e:
+        info(f'Could not shard the functions of {file.path.as_posix()}: {e}')
+        return None
+
+    info(f'Running passes on the functions of {file.path.as_posix()} in {len(shards)} shards')
+    executor = get_executor(file.options.jobs)
+    futures = [executor.submit(run_passes_shard, data, statements) for statements in shard_data]
+
+    results = []
+    for future in futures:
+        results.extend(load_ir(future.result()))
+
+    results.sort(key=lambda result: result[0])
+    symbol_table = file.scope.symbol_table
+    nodes = {}
+    for i, stmt, changed, removed in results:
+        for name in removed:
+            symbol_table.remove(name)
+
+        for name, typ, value, is_mutable in changed:
+            symbol_table.add(ir.Symbol(name, typ, value, file, is_mutable=is_mutable))
+
+        nodes[i] = stmt
+
+    return nodes
+
+def generate_shard(data: bytes, names: frozenset[str]) -> str:
+    from gem.passes.code_generation import CodeGenerationPass
+
+    path, options, program, scope = load_ir(data)
+    file = ir.File(path, scope, worker_options(options))
+    codegen = CodeGenerationPass(file, names, build_libraries=False)
+    return codegen.visit(program)
+
+def generate_sharded(file: ir.File, program: ir.Program):
+    """Generates the LLVM IR of a file with the bodies of its functions split between worker processes, each shard is
+    its own module that declares every function it does not define. The modules are linked into the one generated by
+    this process, or None is returned when the file could not be sent to the workers."""
+    from gem.passes.code_generation import CodeGenerationPass
+
+    # a function is generated by the shard of the top-level function it is an overload of
+    functions = {}
+    for i in shardable_functions(program):
+        for name in function_names(program.nodes[i]):
+            functions.setdefault(name, program.nodes[i].name)
+
+    top_level = list(dict.fromkeys(functions.values()))
+    shards = shard_count(file, len(top_level))
+    if shards == 0:
+        return None
+
+    # the main process keeps the first shard, the others go to the workers
+    names = [
+        frozenset(name for name, owner in functions.items() if owner in shard)
+        for shard in map(set, split(top_level, shards))
+    ]
+    try:
+        data = dump_ir((file.path, file.options, program, file.scope))
+    except (PicklingError, AttributeError, TypeError) as e:
+        info(f'Could not shard the functions of {file.path.as_posix()}: {e}')
+        return None
+
+    info(f'Generating the functions of {file.path.as_posix()} in {shards} shards')
+    executor = get_executor(file.options.jobs)
+    futures = [executor.submit(generate_shard, data, shard) for shard in names[1:]]
+
+    # a context of their own so the identified types of the shards are merged by the linker instead of being renamed by a
+    # context that has seen them before
+    context = llvm.create_context()
+    module = llvm.parse_assembly(CodeGenerationPass(file, names[0]).visit(program), context)
+    for future in futures:
+        module.link_in(llvm.parse_assembly(future.result(), context))
+
+    return str(module)
@@ -0,0 +1,38 @@
+from pathlib import Path
+import unittest
+
+from gem.passes.code_generation import CodeGenerationPass
+from gem import ir, run_compile_passes
+
+
+TESTS_DIR = Path(__file__).parent
+CORE_FILE = TESTS_DIR.parent / 'stdlib' / 'core' / 'core.gem'
+
+
+def prototypes(path: Path):
+    """The define and declare lines of the generated module by function name"""
+    file = ir.File(path, ir.Scope(), ir.CompileOptions(no_cache=True))
+    code = CodeGenerationPass(file, build_libraries=False).visit(run_compile_passes(file))
+    return {
+        line.split('@', 1)[1].split('(', 1)[0].strip('"'): line
+        for line in code.splitlines() if line.startswith(('define', 'declare'))
+    }
+
+class AttributesTest(unittest.TestCase):
+    def test_allocators(self):
+        functions = prototypes(CORE_FILE)
+        self.assertRegex(functions['gem_alloc'], r'^define noalias i8\* .*\) allocsize\(0\) norecurse nounwind$')
+        self.assertIn(' allocsize(1) ', functions['gem_realloc'])
+        self.assertIn(' allocsize(0, 1) ', functions['gem_zalloc'])
+        self.assertIn(' readnone willreturn', functions['string.to_string'])
+        self.assertIn(' cold noreturn ', functions['exit'])
+
+    def test_declarations(self):
+        # the modules using a library declare its functions with the same attributes
+        functions = prototypes(TESTS_DIR / 'generics.gem')
+        self.assertRegex(functions['gem_alloc'], r'^declare external noalias i8\* .*\) allocsize\(0\) norecurse nounwind$')
+        self.assertIn(' nounwind', functions['main'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+from pathlib import Path
+import unittest
+
+from gem.passes.code_generation import CodeGenerationPass
+from gem import ir, run_compile_passes
+
+
+TESTS_DIR = Path(__file__).parent
+
+
+def defined_functions(name: str):
+    file = ir.File(TESTS_DIR / f'{name}.gem', ir.Scope(), ir.CompileOptions(no_cache=True))
+    # without the object files of the used libraries, which would be written next to their sources
+    code = CodeGenerationPass(file, build_libraries=False).visit(run_compile_passes(file))
+    return [line.split('@', 1)[1].split('(', 1)[0] for line in code.splitlines() if line.startswith('define')]
+
+class GenericsTest(unittest.TestCase):
+    def test_instances_are_defined_once(self):
+        # id is called with int three times (once through twice), bool and float, count calls itself
+        self.assertCountEqual(defined_functions('generics'), [
+            '"id<int>"', '"id<bool>"', '"id<float>"', '"count<bool>"', '"twice"', '"main"'
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+from dataclasses import fields
+from inspect import isabstract
+from pathlib import Path
+from io import BytesIO
+import pickle
+import unittest
+
+from gem.ir_serializer import GIRB_MAGIC, GIRB_VERSION, dump_ir, load_ir, node_classes
+from gem import ir, parse, run_compile_passes
+
+
+TESTS_DIR = Path(__file__).parent
+SOURCES = [
+    TESTS_DIR.parent / 'stdlib' / 'core' / 'core.gem', TESTS_DIR.parent.parent / 'examples' / 'test.gem',
+    *sorted(TESTS_DIR.glob('*.gem'))
+]
+
+
+def programs():
+    """The parsed and the compiled program of every source"""
+    for path in SOURCES:
+        yield parse(ir.File(path, ir.Scope(), ir.CompileOptions(no_cache=True)))
+        yield run_compile_passes(ir.File(path, ir.Scope(), ir.CompileOptions(no_cache=True)))
+
+def walk(value):
+    if isinstance(value, (ir.Node, ir.FunctionFlags)):
+        yield value
+        for field in fields(value):
+            yield from walk(getattr(value, field.name))
+    elif isinstance(value, (list, tuple)):
+        for element in value:
+            yield from walk(element)
+
+def girb(obj) -> bytes:
+    buffer = BytesIO()
+    buffer.write(GIRB_MAGIC)
+    buffer.write(bytes([GIRB_VERSION]))
+    pickle.dump(obj, buffer, pickle.HIGHEST_PROTOCOL)
+    return buffer.getvalue()
+
+class Exploit:
+    def __reduce__(self):
+        return print, ('loaded',)
+
+class IRSerializerTest(unittest.TestCase):
+    def test_round_trip(self):
+        classes = set()
+        for program in programs():
+            loaded = load_ir(dump_ir(program))
+            self.assertEqual(loaded, program)
+            self.assertEqual(str(loaded), str(program))
+
+            for node in walk(loaded):
+                classes.add(type(node))
+                if isinstance(node, ir.Node):
+                    self.assertIs(type(node.pos), ir.Position)
+                # loaded types are interned like the ones of the parser
+                if isinstance(node, ir.Type):
+                    self.assertIs(node, type(node)(node.type))
+
+        missing = {cls for cls in node_classes() if not isabstract(cls)} - classes
+        self.assertFalse(missing, f'not covered by the test sources: {missing}')
+
+    def test_only_ir_is_loaded(self):
+        with self.assertRaises(pickle.UnpicklingError):
+            load_ir(girb(Exploit()))
+
+        with self.assertRaises(pickle.UnpicklingError):
+            load_ir(girb(ir.Position.comptime_error))
+
+    def test_given_classes_are_loaded(self):
+        with self.assertRaises(pickle.UnpicklingError):
+            load_ir(girb(BytesIO))
+
+        self.assertIs(load_ir(girb(BytesIO), (BytesIO,)), BytesIO)
+
+
+if __name__ == '__main__':
+    unittest.main()
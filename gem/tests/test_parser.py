@@ -0,0 +1,102 @@
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from unittest import mock
+import unittest
+
+from gem.antlr_ir_builder import ANTLRIRBuilder
+from gem.ir_builder import IRBuilder
+from gem import ir
+
+
+TESTS_DIR = Path(__file__).parent
+SOURCES = [
+    TESTS_DIR.parent / 'stdlib' / 'core' / 'core.gem', TESTS_DIR.parent.parent / 'examples' / 'test.gem',
+    *sorted(TESTS_DIR.glob('*.gem'))
+]
+
+
+class CompileError(Exception):
+    pass
+
+def raise_error(pos: ir.Position, file: ir.File, message: str):
+    raise CompileError(pos.line, pos.column, message)
+
+def build(builder: type, path: Path):
+    return builder(ir.File(path, ir.Scope(), ir.CompileOptions(no_cache=True))).build()
+
+class ParserTest(unittest.TestCase):
+    """The native parser must build the same IR and report the same errors as the ANTLR parser generated from Gem.g4"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def source(self, code: str):
+        path = Path(self.tmp_dir.name) / 'test.gem'
+        path.write_text(code, 'utf-8')
+        return path
+
+    def assert_same_program(self, path: Path):
+        native, antlr = build(IRBuilder, path), build(ANTLRIRBuilder, path)
+        self.assertEqual(str(native), str(antlr))
+        self.assertEqual(native, antlr)
+
+    def assert_same_error(self, code: str, line: int, column: int, message: str):
+        path = self.source(code)
+        with mock.patch.object(ir.Position, 'comptime_error', raise_error):
+            for builder in (IRBuilder, ANTLRIRBuilder):
+                with self.subTest(code=code, parser=builder.__name__), self.assertRaises(CompileError) as e:
+                    build(builder, path)
+
+                self.assertEqual(e.exception.args, (line, column, message))
+
+    def test_sources(self):
+        for path in SOURCES:
+            with self.subTest(path=path.name):
+                self.assert_same_program(path)
+
+    def test_expressions(self):
+        expressions = [
+            # precedence
+            '1 + 2 * 3 - 4 / 2 % 5 == 6 && a || b != c',
+            '!a && b', '-1 - -2', '- a * b', '+a + b',
+            'a.b.c(1, 2).d * 2',
+            # cast or bracketed
+            '(int) a + 1', '(a) + 1', '(a)', '(int&) a', '((float) a)', '(a + b) * c',
+            # ternary
+            '1 if a else 2', 'a.b if c else d.e()', 'f(1 if a else 2, b)', '1 if a else 2 if b else 3',
+            'new string(a, 1) if a > b else new string(b, 2)'
+        ]
+        for expr in expressions:
+            with self.subTest(expr=expr):
+                self.assert_same_program(self.source(f'x = {expr}\n'))
+
+    def test_statements(self):
+        self.assert_same_program(self.source(
+            'fn f<T>(mut T a, int& b) -> T {\n'
+            '    if a {\n'
+            '        return a\n'
+            '    } else if b {\n'
+            '        break\n'
+            '    }\n'
+            '    x = 1 if a else 2\n'
+            '    if x { }\n'
+            '    x += 1\n'
+            '}\n'
+            'fn string.new(int n) { }\n'
+            'fn int.to_string(int n) -> string { return "" }\n'
+            'use "core"\n'
+        ))
+
+    def test_syntax_errors(self):
+        self.assert_same_error('fn main( -> int {\n}\n', 1, 9, 'invalid syntax \'->\'')
+        self.assert_same_error('x = (1 + 2\n', 2, 0, 'invalid syntax \'<EOF>\'')
+        self.assert_same_error('fn f() -> int {\n    return\n}\n', 3, 0, 'invalid syntax \'}\'')
+        self.assert_same_error('x = 1 if true\n', 2, 0, 'invalid syntax \'<EOF>\'')
+        self.assert_same_error('use core\n', 1, 4, 'invalid syntax \'core\'')
+        self.assert_same_error('y = 1\nfn f() -> { }\n', 2, 10, 'invalid syntax \'{\'')
+        self.assert_same_error('extern nothere\n', 1, 0, 'unknown c object \'nothere\'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+from time import perf_counter, thread_time
+from dataclasses import dataclass, fields, asdict
+from contextlib import contextmanager
+from subprocess import Popen
+from threading import Lock
+from sys import platform, stderr
+from pathlib import Path
+import json
+import os
+
+from gem import ir
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, memory usage is not reported there
+    resource = None
+
+
+def peak_rss():
+    """Returns the peak resident set size of this process in KiB"""
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if platform == 'darwin' else rss
+
+def count_nodes(node: ir.Node) -> int:
+    count = 1
+    for field in fields(node):
+        value = getattr(node, field.name)
+        if isinstance(value, ir.Node):
+            count += count_nodes(value)
+        elif isinstance(value, list):
+            count += sum(count_nodes(element) for element in value if isinstance(element, ir.Node))
+
+    return count
+
+
+@dataclass
+class PhaseTiming:
+    """`peak_rss` is in KiB. For a phase run in this process it is how much the process-wide peak grew during the
+    phase, which is 0 when the phase stayed under an earlier peak; for a command it is the command's own peak"""
+    phase: str
+    file: str
+    wall: float = 0.0
+    cpu: float | None = None
+    peak_rss: int | None = None
+    nodes: int | None = None
+    recorded: bool = True
+
+    def count_nodes(self, node: ir.Node):
+        if self.recorded:
+            self.nodes = count_nodes(node)
+
+
+class PassTimer:
+    """Collects the wall time, CPU time, peak memory growth and IR size of every phase of a build (parsing, each pass,
+    code generation, object emission, every clang invocation and the link) for `--time-passes`"""
+
+    def __init__(self):
+        self.enabled = False
+        self.started = 0.0
+        self.timings: list[PhaseTiming] = []
+        self.lock = Lock()
+
+    def start(self):
+        self.enabled = True
+        self.started = perf_counter()
+
+    def add(self, timing: PhaseTiming):
+        with self.lock:
+            self.timings.append(timing)
+
+    @contextmanager
+    def phase(self, phase: str, path: Path):
+        if not self.enabled:
+            yield PhaseTiming(phase, path.as_posix(), recorded=False)
+            return
+
+        timing = PhaseTiming(phase, path.as_posix())
+        start_rss = peak_rss()
+        start_cpu = thread_time()
+        start = perf_counter()
+        yield timing
+
+        timing.wall = perf_counter() - start
+        timing.cpu = thread_time() - start_cpu
+        if start_rss is not None:
+            timing.peak_rss = peak_rss() - start_rss
+
+        self.add(timing)
+
+    def wait(self, process: Popen, start: float, phase: str, path: Path):
+        """Waits for a command started at `start`, recording the CPU time and peak memory of the command and everything
+        it spawned when the platform can report them"""
+        if not self.enabled or not hasattr(os, 'wait4'):
+            process.wait()
+            if self.enabled:
+                self.add(PhaseTiming(phase, path.as_posix(), perf_counter() - start))
+
+            return process.returncode
+
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        rss = usage.ru_maxrss // 1024 if platform == 'darwin' else usage.ru_maxrss
+        self.add(PhaseTiming(phase, path.as_posix(), perf_counter() - start, usage.ru_utime + usage.ru_stime, rss))
+        return process.returncode
+
+    def command(self, cmd: str, phase: str, path: Path):
+        start = perf_counter()
+        return self.wait(Popen(cmd, shell=True), start, phase, path)
+
+    def report(self, format: str):
+        with self.lock:
+            timings = list(self.timings)
+
+        if format == 'json':
+            records = []
+            for timing in timings:
+                record = asdict(timing)
+                del record['recorded']
+                records.append(record)
+
+            print(json.dumps(records, indent=2), file=stderr)
+            return
+
+        # phases nest (a library's passes run inside the pass of the file using it) and overlap across threads, so the
+        # total is the wall time of the whole build rather than the sum of the phases
+        total = perf_counter() - self.started
+        print('===== Gem time report =====', file=stderr)
+        print(f'{"Wall (s)":>10} {"CPU (s)":>10} {"Peak RSS KiB":>14} {"IR nodes":>9}  Phase (file)', file=stderr)
+        for timing in timings:
+            cpu = f'{timing.cpu:.4f}' if timing.cpu is not None else '-'
+            rss = str(timing.peak_rss) if timing.peak_rss is not None else '-'
+            nodes = str(timing.nodes) if timing.nodes is not None else '-'
+            print(f'{timing.wall:>10.4f} {cpu:>10} {rss:>14} {nodes:>9}  {timing.phase} ({timing.file})', file=stderr)
+
+        print(f'{total:>10.4f} {"":>10} {"":>14} {"":>9}  Total', file=stderr)
+        print('Peak RSS is how much the peak of gem grew during a phase, or the peak of a command', file=stderr)
+
+
+TIMER = PassTimer()